@@ -1,25 +1,40 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
 import os
+import tomllib
 from datetime import datetime
 
-# --- CONSTANTES GLOBALES (pueden ser cargadas desde un archivo de configuración si es necesario) ---
+from almacen_columnar import AlmacenColumnar, obtener_almacen
+
+# --- CONSTANTES GLOBALES (valores por defecto; se pueden sobrescribir con un archivo de configuración TOML) ---
 # Costos fijos (ejemplo, ajustar según realidad)
 COSTO_INHOUSE_FIJO = 2000000  # Costo fijo mensual de InHouse
 COSTO_PRIMERA_MILLA_FIJO = 2000000 # Costo fijo mensual de Primera Milla
 
-# Nombres de archivos esperados en la carpeta de datos
-MAESTROS_ESPERADOS = [
-    "MA_REGION.xlsx",
-    "MA_CIUDAD.xlsx",
-    "MA_TRONCAL.xlsx",
-    "MA_SERVICIO.xlsx",
-    "MA_CARGO_ADICIONAL.xlsx",
-    "MA_TARIFA_PESO.xlsx",
-    "MA_COSTO_HANDLING.xlsx",
-    "MA_COSTO_ULTIMAMILLA.xlsx",
-    "MA_TIPO_ENTREGA.xlsx" # Agregamos este porque se usa
-]
+# Costos fijos que se reparten entre los envíos, por columna de resultado
+COSTOS_FIJOS = {
+    "COSTO PRIMERA MILLA": COSTO_PRIMERA_MILLA_FIJO,
+    "COSTO INHOUSE": COSTO_INHOUSE_FIJO
+}
+
+# Clave de asignación de cada costo fijo: "envio" (partes iguales), "peso" o "km"
+CLAVES_ASIGNACION_COSTOS_FIJOS = {
+    "COSTO PRIMERA MILLA": "envio",
+    "COSTO INHOUSE": "envio"
+}
+
+# Columna del resultado usada como base para cada clave de asignación (None = una unidad por envío)
+BASES_ASIGNACION = {
+    "envio": None,
+    "peso": "PESO",
+    "km": "KM_RECORRIDO"
+}
+
+# Rango válido de peso por envío (kg). Fuera de este rango el envío se reporta en la validación
+PESO_MINIMO_KG = 0 # Exclusivo: un envío debe pesar más de 0 kg
+PESO_MAXIMO_KG = 1000
 
 # Columnas esperadas en el archivo de cotización de entrada
 COLUMNAS_COTIZACION_ENTRADA = [
@@ -39,25 +54,261 @@ COLUMNAS_RESULTADO_FINAL = [
     "ID_REGION_ORIGEN", "ID_REGION_DESTINO", "ID_SERVICIO", "ID_TIPO_ENTREGA",
     "VALOR TARIFA CLIENTE", "CARGO ADICIONAL", "VALOR HANDLING", "VALOR ULTIMA MILLA",
     "VALOR NETO", "COSTO TRONCAL", "COSTO PRIMERA MILLA", "COSTO ULTIMA MILLA",
-    "COSTO HANDLING", "COSTO TOTAL", "UTILIDAD NETA", "MARGEN %", "KM_RECORRIDO"
+    "COSTO HANDLING", "COSTO INHOUSE", "COSTO TOTAL", "UTILIDAD NETA", "MARGEN %", "KM_RECORRIDO",
+    "ID_AGENCIA_ORIGEN", "ID_AGENCIA_DESTINO", "ENTREGA INDIRECTA"
+]
+
+# Esquema esperado de cada archivo: columnas requeridas con su tipo ("numerico" o "texto")
+# y columnas que forman la clave única del maestro
+ESQUEMA_ARCHIVOS = {
+    "cotizar": {
+        "columnas": {col: "texto" for col in COLUMNAS_COTIZACION_ENTRADA if col != "PESO"} | {"PESO": "numerico"},
+        "clave": []
+    },
+    "ma_region": {"columnas": {"ID_REGION": "numerico", "REGION": "texto"}, "clave": ["ID_REGION"]},
+    "ma_ciudad": {
+        "columnas": {"ID_CIUDAD": "numerico", "ID_REGION": "numerico", "COMUNA": "texto", "CODIGO_POSTAL": "texto"},
+        "clave": ["COMUNA"]
+    },
+    "ma_troncal": {
+        "columnas": {"ID_REGION_ORIGEN": "numerico", "ID_REGION_DESTINO": "numerico",
+                     "COSTO_TRONCAL": "numerico", "KM_RECORRIDO": "numerico"},
+        "clave": ["ID_REGION_ORIGEN", "ID_REGION_DESTINO"]
+    },
+    "ma_servicio": {"columnas": {"ID_SERVICIO": "numerico", "TIPO SERVICIO": "texto"}, "clave": ["TIPO SERVICIO"]},
+    "ma_cargo_adicional": {
+        "columnas": {"ID_SERVICIO": "numerico", "ID_TIPO_ENTREGA": "numerico", "CARGO_ADICIONAL": "numerico"},
+        "clave": ["ID_SERVICIO", "ID_TIPO_ENTREGA"]
+    },
+    "ma_tarifa_peso": {
+        "columnas": {"TARIFARIO": "texto", "PESO_KG": "numerico", "VALOR_KG": "numerico"},
+        "clave": ["TARIFARIO", "PESO_KG"]
+    },
+    "ma_costo_handling": {
+        "columnas": {"ID_SERVICIO": "numerico", "ID_TIPO_ENTREGA": "numerico", "COSTO_HANDLING": "numerico"},
+        "clave": ["ID_SERVICIO", "ID_TIPO_ENTREGA"]
+    },
+    "ma_costo_ultimamilla": {
+        "columnas": {"ID_REGION": "numerico", "ID_CIUDAD": "numerico", "COSTO_ULTIMAMILLA": "numerico"},
+        "clave": ["ID_REGION", "ID_CIUDAD"]
+    },
+    "ma_tipo_entrega": {"columnas": {"ID_TIPO_ENTREGA": "numerico", "TIPO ENTREGA": "texto"}, "clave": ["TIPO ENTREGA"]},
+    "ma_agencia": {
+        "columnas": {"AGENCODIGO": "numerico", "COMUCODIGO": "numerico", "CIUDCODIGO": "numerico", "AGENESCENTRAL": "numerico"},
+        "clave": ["AGENCODIGO"]
+    },
+    "ma_dest_indirecto": {"columnas": {"CIUDCODIGO": "numerico", "AGENCODIGOBASE": "numerico"}, "clave": ["CIUDCODIGO"]}
+}
+
+# Integridad referencial entre archivos: (archivo, columna, archivo referenciado, columna referenciada)
+INTEGRIDAD_REFERENCIAL = [
+    ("ma_ciudad", "ID_REGION", "ma_region", "ID_REGION"),
+    ("ma_troncal", "ID_REGION_ORIGEN", "ma_region", "ID_REGION"),
+    ("ma_troncal", "ID_REGION_DESTINO", "ma_region", "ID_REGION"),
+    ("ma_cargo_adicional", "ID_SERVICIO", "ma_servicio", "ID_SERVICIO"),
+    ("ma_cargo_adicional", "ID_TIPO_ENTREGA", "ma_tipo_entrega", "ID_TIPO_ENTREGA"),
+    ("ma_costo_handling", "ID_SERVICIO", "ma_servicio", "ID_SERVICIO"),
+    ("ma_costo_handling", "ID_TIPO_ENTREGA", "ma_tipo_entrega", "ID_TIPO_ENTREGA"),
+    ("ma_costo_ultimamilla", "ID_CIUDAD", "ma_ciudad", "ID_CIUDAD"),
+    ("ma_dest_indirecto", "AGENCODIGOBASE", "ma_agencia", "AGENCODIGO"),
+    ("cotizar", "TARIFARIO", "ma_tarifa_peso", "TARIFARIO"),
+    ("cotizar", "TIPO SERVICIO", "ma_servicio", "TIPO SERVICIO"),
+    ("cotizar", "TIPO ENTREGA", "ma_tipo_entrega", "TIPO ENTREGA")
 ]
 
+# Maestros que no entrega `cargar_archivos` (el cálculo los usa a través del índice de agencias)
+# y que `validar_datos` carga por su cuenta, solo con las columnas del esquema
+MAESTROS_SOLO_VALIDACION = ["ma_agencia", "ma_dest_indirecto"]
+
+# Columnas de MA_AGENCIA que se usan para construir el índice de cobertura
+COLUMNAS_INDICE_AGENCIAS = [
+    "AGENCODIGO", "COMUCODIGO", "CIUDCODIGO", "AGENESCENTRAL",
+    "AGENINIOPERACION", "AGENFINOPERACION", "AGENINIATENCION", "AGENFINATENCION"
+]
+
+
+# Archivo de cada maestro, por clave de `Configuracion.rutas`
+ARCHIVOS_MAESTROS = {
+    "ma_region": "MA_REGION.xlsx",
+    "ma_ciudad": "MA_CIUDAD.xlsx",
+    "ma_troncal": "MA_TRONCAL.xlsx",
+    "ma_servicio": "MA_SERVICIO.xlsx",
+    "ma_cargo_adicional": "MA_CARGO_ADICIONAL.xlsx",
+    "ma_tarifa_peso": "MA_TARIFA_PESO.xlsx",
+    "ma_costo_handling": "MA_COSTO_HANDLING.xlsx",
+    "ma_costo_ultimamilla": "MA_COSTO_ULTIMAMILLA.xlsx",
+    "ma_tipo_entrega": "MA_TIPO_ENTREGA.xlsx",
+    "ma_agencia": "MA_AGENCIA.xlsx",
+    "ma_dest_indirecto": "MA_DEST_INDIRECTO_NUEVO.xlsx",
+    "rl_matriz_sector": "RL_MATRIZ_SECTOR.xlsx"
+}
+
+# Tipo esperado de cada opción del archivo de configuración. Las claves con '*' aplican a
+# cualquier maestro o costo fijo
+TIPOS_CONFIGURACION = {
+    "datos.base_path": str,
+    "maestros.*.archivo": str,
+    "maestros.*.columnas": dict,
+    "cotizacion.columnas": dict,
+    "costos_fijos.*.monto": (int, float),
+    "costos_fijos.*.clave": str,
+    "motor.tamano_bloque": int,
+    "motor.n_procesos": int,
+    "motor.directorio_cache": str,
+    "motor.cache_max_mb": int,
+    "motor.cache_max_memoria": int,
+    "validacion.peso_minimo_kg": (int, float),
+    "validacion.peso_maximo_kg": (int, float)
+}
+
+def _aplanar_configuracion(valores: dict, prefijo: str = "") -> dict:
+    """Convierte la configuración anidada en claves con puntos (los mapeos de columnas quedan como valor)."""
+    plana = {}
+    for clave, valor in valores.items():
+        clave_completa = f"{prefijo}{clave}"
+        if isinstance(valor, dict) and clave != "columnas":
+            plana.update(_aplanar_configuracion(valor, f"{clave_completa}."))
+        else:
+            plana[clave_completa] = valor
+    return plana
+
+def _tipo_esperado(clave: str):
+    """Busca el tipo esperado de una clave plana de configuración, o None si la clave no existe."""
+    partes = clave.split(".")
+    for patron, tipo in TIPOS_CONFIGURACION.items():
+        partes_patron = patron.split(".")
+        if len(partes_patron) == len(partes) and all(p == "*" or p == q for p, q in zip(partes_patron, partes)):
+            return tipo
+    return None
+
 
 class Configuracion:
-    """Clase para manejar la configuración de rutas y archivos."""
-    def __init__(self, base_path="data/"):
+    """Clase para manejar la configuración de rutas, archivos, costos fijos y opciones del motor."""
+    def __init__(self, base_path="data/", archivo_config=None):
+        # Carpeta de datos recibida al crear la configuración; se usa cuando el archivo no define
+        # `datos.base_path`. `self.base_path` es la carpeta vigente
+        self.base_path_inicial = base_path
         self.base_path = base_path
+        self.archivo_config = archivo_config
+        self._mtime_config = None
+        self._valores = {}
+
+        valores = self._valores_por_defecto()
+        if archivo_config:
+            valores_archivo, mtime = self._leer_archivo_config()
+            valores.update(valores_archivo)
+        self._aplicar(valores)
+        if archivo_config:
+            self._mtime_config = mtime
+
+    def _valores_por_defecto(self) -> dict:
+        """Configuración plana equivalente a las constantes globales del módulo."""
+        valores = {"datos.base_path": self.base_path_inicial}
+        for key, archivo in ARCHIVOS_MAESTROS.items():
+            valores[f"maestros.{key}.archivo"] = archivo
+            valores[f"maestros.{key}.columnas"] = {}
+        valores["cotizacion.columnas"] = {}
+        for columna_costo, monto in COSTOS_FIJOS.items():
+            valores[f"costos_fijos.{columna_costo}.monto"] = monto
+            valores[f"costos_fijos.{columna_costo}.clave"] = CLAVES_ASIGNACION_COSTOS_FIJOS.get(columna_costo, "envio")
+        valores["motor.tamano_bloque"] = 0
+        valores["motor.n_procesos"] = 1
+        valores["motor.directorio_cache"] = ".cache"
+        valores["motor.cache_max_mb"] = 500
+        valores["motor.cache_max_memoria"] = 8
+        valores["validacion.peso_minimo_kg"] = PESO_MINIMO_KG
+        valores["validacion.peso_maximo_kg"] = PESO_MAXIMO_KG
+        return valores
+
+    def _leer_archivo_config(self) -> tuple[dict, int]:
+        """Lee y valida el archivo TOML de configuración, devolviendo sus valores aplanados y su fecha de modificación."""
+        mtime = os.stat(self.archivo_config).st_mtime_ns # Antes de leer: un cambio posterior se vuelve a leer
+        with open(self.archivo_config, "rb") as f:
+            valores = _aplanar_configuracion(tomllib.load(f))
+
+        for clave, valor in valores.items():
+            tipo = _tipo_esperado(clave)
+            if tipo is None:
+                raise ValueError(f"Opción '{clave}' desconocida en '{self.archivo_config}'.")
+            if not isinstance(valor, tipo) or isinstance(valor, bool):
+                raise ValueError(f"La opción '{clave}' en '{self.archivo_config}' tiene un tipo inválido: "
+                                 f"{type(valor).__name__}.")
+            if clave.startswith("maestros.") and clave.split(".")[1] not in ARCHIVOS_MAESTROS:
+                raise ValueError(f"Maestro '{clave.split('.')[1]}' desconocido en '{self.archivo_config}'.")
+            # Solo los costos fijos con columna propia en el resultado entran al COSTO TOTAL y al resumen
+            if clave.startswith("costos_fijos.") and clave.split(".")[1] not in COSTOS_FIJOS:
+                raise ValueError(f"Costo fijo '{clave.split('.')[1]}' desconocido en '{self.archivo_config}'. "
+                                 f"Usa uno de {list(COSTOS_FIJOS)}.")
+            if clave.endswith(".clave") and valor not in BASES_ASIGNACION:
+                raise ValueError(f"Clave de asignación '{valor}' inválida en '{clave}'. Usa una de {list(BASES_ASIGNACION)}.")
+        return valores, mtime
+
+    def _aplicar(self, valores: dict) -> None:
+        """Actualiza los atributos de la configuración a partir de los valores aplanados."""
+        self._valores = valores
+        self.base_path = valores["datos.base_path"]
         self.rutas = {
-            "ma_region": os.path.join(base_path, "MA_REGION.xlsx"),
-            "ma_ciudad": os.path.join(base_path, "MA_CIUDAD.xlsx"),
-            "ma_troncal": os.path.join(base_path, "MA_TRONCAL.xlsx"),
-            "ma_servicio": os.path.join(base_path, "MA_SERVICIO.xlsx"),
-            "ma_cargo_adicional": os.path.join(base_path, "MA_CARGO_ADICIONAL.xlsx"),
-            "ma_tarifa_peso": os.path.join(base_path, "MA_TARIFA_PESO.xlsx"),
-            "ma_costo_handling": os.path.join(base_path, "MA_COSTO_HANDLING.xlsx"),
-            "ma_costo_ultimamilla": os.path.join(base_path, "MA_COSTO_ULTIMAMILLA.xlsx"),
-            "ma_tipo_entrega": os.path.join(base_path, "MA_TIPO_ENTREGA.xlsx")
+            key: os.path.join(self.base_path, valores[f"maestros.{key}.archivo"]) for key in ARCHIVOS_MAESTROS
         }
+        self.mapeo_columnas = {key: valores[f"maestros.{key}.columnas"] for key in ARCHIVOS_MAESTROS}
+        self.mapeo_columnas["cotizar"] = valores["cotizacion.columnas"]
+
+        columnas_costo = list(dict.fromkeys(clave.split(".")[1] for clave in valores if clave.startswith("costos_fijos.")))
+        self.costos_fijos = {col: valores[f"costos_fijos.{col}.monto"] for col in columnas_costo
+                             if f"costos_fijos.{col}.monto" in valores}
+        self.claves_asignacion = {col: valores.get(f"costos_fijos.{col}.clave", "envio") for col in self.costos_fijos}
+
+        self.tamano_bloque = valores["motor.tamano_bloque"] or None # 0 = sin bloques
+        self.n_procesos = valores["motor.n_procesos"]
+        self.directorio_cache = valores["motor.directorio_cache"]
+        self.cache_max_mb = valores["motor.cache_max_mb"]
+        self.cache_max_memoria = valores["motor.cache_max_memoria"]
+        self.peso_minimo_kg = valores["validacion.peso_minimo_kg"]
+        self.peso_maximo_kg = valores["validacion.peso_maximo_kg"]
+
+    def huella(self, excluir: tuple[str, ...] = ("motor.",)) -> str:
+        """
+        Calcula un hash de los valores de configuración que afectan el resultado del cálculo.
+
+        Args:
+            excluir (tuple[str, ...]): Prefijos de opciones que no se consideran. Por defecto se
+                                       excluyen las opciones del motor, que no cambian los números.
+
+        Returns:
+            str: Hash hexadecimal de la configuración.
+        """
+        valores = {clave: valor for clave, valor in self._valores.items() if not clave.startswith(excluir)}
+        return hashlib.sha256(json.dumps(valores, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def recargar(self, forzar: bool = False) -> list[str]:
+        """
+        Vuelve a leer el archivo de configuración si cambió en disco.
+
+        Solo se invalidan las cachés derivadas que dependen de las opciones modificadas.
+
+        Args:
+            forzar (bool): Releer aunque el archivo no haya cambiado.
+
+        Returns:
+            list[str]: Opciones (claves con puntos) cuyo valor cambió.
+        """
+        if not self.archivo_config:
+            return []
+        if not forzar and os.stat(self.archivo_config).st_mtime_ns == self._mtime_config:
+            return []
+
+        anteriores = self._valores
+        valores = self._valores_por_defecto()
+        valores_archivo, mtime = self._leer_archivo_config()
+        valores.update(valores_archivo)
+        self._aplicar(valores)
+        # La fecha se registra solo si el archivo es válido: uno inválido se vuelve a informar en cada recarga
+        self._mtime_config = mtime
+
+        cambiadas = sorted(clave for clave in set(anteriores) | set(valores)
+                           if anteriores.get(clave) != valores.get(clave))
+        invalidar_caches(cambiadas)
+        return cambiadas
 
 def validar_archivos(config: Configuracion) -> tuple[bool, list[str]]:
     """
@@ -78,6 +329,213 @@ def validar_archivos(config: Configuracion) -> tuple[bool, list[str]]:
             todos_ok = False
     return todos_ok, archivos_faltantes
 
+def _error_validacion(archivo: str, regla: str, columna, mensaje: str, filas=None, nivel: str = "error") -> dict:
+    """Construye una entrada del reporte de validación."""
+    filas = [] if filas is None else [int(i) if isinstance(i, (int, np.integer)) else i for i in filas]
+    return {
+        "nivel": nivel,
+        "archivo": archivo,
+        "regla": regla,
+        "columna": columna,
+        "mensaje": mensaje,
+        "total_filas": len(filas),
+        "filas": filas
+    }
+
+def validar_datos(archivos: dict[str, pd.DataFrame], config: Configuracion = None) -> tuple[bool, list[dict]]:
+    """
+    Valida en una sola pasada el esquema y los datos de todos los maestros y de la cotización.
+
+    Revisa presencia de columnas, tipos, unicidad de claves, integridad referencial entre
+    archivos y rango de pesos. No se detiene en el primer problema: devuelve el reporte completo.
+
+    Args:
+        archivos (dict[str, pd.DataFrame]): Diccionario de DataFrames tal como lo entrega `cargar_archivos`.
+        config (Configuracion, optional): Configuración con el rango de pesos válido y las rutas de los
+                                          maestros de `MAESTROS_SOLO_VALIDACION`, que se agregan a la
+                                          validación. Por defecto se usan `PESO_MINIMO_KG` y `PESO_MAXIMO_KG`
+                                          y solo se validan los archivos entregados.
+
+    Returns:
+        tuple[bool, list[dict]]: True si no hay errores (las advertencias no bloquean), junto con la
+                                 lista de problemas. Cada problema indica nivel, archivo, regla,
+                                 columna, mensaje y los índices de las filas afectadas.
+    """
+    peso_minimo = PESO_MINIMO_KG if config is None else config.peso_minimo_kg
+    peso_maximo = PESO_MAXIMO_KG if config is None else config.peso_maximo_kg
+    reporte = []
+    vistas = {}
+
+    if config is not None:
+        archivos = dict(archivos)
+        for key in MAESTROS_SOLO_VALIDACION:
+            if key not in archivos and os.path.exists(config.rutas[key]):
+                archivos[key] = cargar_columnas_esquema(config, key)
+
+    # --- Presencia de archivos, columnas y tipos ---
+    for archivo, esquema in ESQUEMA_ARCHIVOS.items():
+        if archivo not in archivos:
+            continue # La existencia de los archivos se revisa en `validar_archivos`
+
+        # Vista con nombres de columnas estandarizados, sin copiar los datos
+        vista = archivos[archivo].copy(deep=False)
+        vista.columns = vista.columns.astype(str).str.upper().str.strip()
+        vistas[archivo] = vista
+
+        faltantes = [col for col in esquema["columnas"] if col not in vista.columns]
+        for col in faltantes:
+            reporte.append(_error_validacion(archivo, "columna_faltante", col, f"La columna '{col}' no se encontró en '{archivo}'."))
+
+        for col, tipo in esquema["columnas"].items():
+            if col in faltantes or tipo != "numerico" or pd.api.types.is_numeric_dtype(vista[col]):
+                continue
+            convertida = pd.to_numeric(vista[col], errors='coerce')
+            invalidas = vista.index[convertida.isnull() & vista[col].notnull()]
+            if len(invalidas) > 0:
+                reporte.append(_error_validacion(archivo, "tipo_invalido", col,
+                                                 f"La columna '{col}' de '{archivo}' tiene valores no numéricos.", invalidas))
+
+        # --- Unicidad de claves ---
+        clave = esquema["clave"]
+        if clave and not any(col in faltantes for col in clave):
+            duplicadas = vista.index[vista.duplicated(subset=clave, keep=False)]
+            if len(duplicadas) > 0:
+                reporte.append(_error_validacion(archivo, "clave_duplicada", clave,
+                                                 f"La clave {clave} de '{archivo}' tiene valores repetidos.", duplicadas))
+
+    # --- Integridad referencial entre archivos ---
+    for archivo, columna, referido, columna_referida in INTEGRIDAD_REFERENCIAL:
+        if archivo not in vistas or referido not in vistas:
+            continue
+        hijo, padre = vistas[archivo], vistas[referido]
+        if columna not in hijo.columns or columna_referida not in padre.columns:
+            continue
+        huerfanas = hijo.index[hijo[columna].notnull() & ~hijo[columna].isin(padre[columna_referida])]
+        if len(huerfanas) > 0:
+            reporte.append(_error_validacion(archivo, "referencia_invalida", columna,
+                                             f"Valores de '{columna}' en '{archivo}' no existen en '{referido}.{columna_referida}'.",
+                                             huerfanas))
+
+    # --- Reglas propias de la cotización ---
+    cotizar = vistas.get("cotizar")
+    if cotizar is not None:
+        if "PESO" in cotizar.columns:
+            peso = pd.to_numeric(cotizar["PESO"], errors='coerce')
+            fuera_rango = cotizar.index[peso.isnull() | (peso <= peso_minimo) | (peso > peso_maximo)]
+            if len(fuera_rango) > 0:
+                reporte.append(_error_validacion("cotizar", "peso_fuera_rango", "PESO",
+                                                 f"Pesos vacíos, no numéricos o fuera del rango ({peso_minimo}, {peso_maximo}] kg.",
+                                                 fuera_rango))
+
+        # Comunas no encontradas: el cálculo continúa, pero se informa igual que en `convertir_ciudades`
+        ciudad = vistas.get("ma_ciudad")
+        if ciudad is not None and "COMUNA" in ciudad.columns:
+            comunas = ciudad["COMUNA"].astype(str).str.upper().str.strip()
+            for col in ["ORIGEN", "DESTINO"]:
+                if col not in cotizar.columns:
+                    continue
+                sin_mapear = cotizar.index[~cotizar[col].astype(str).str.upper().str.strip().isin(comunas)]
+                if len(sin_mapear) > 0:
+                    reporte.append(_error_validacion("cotizar", "comuna_no_encontrada", col,
+                                                     f"Comunas de {col} que no existen en 'ma_ciudad'.",
+                                                     sin_mapear, nivel="advertencia"))
+
+    todos_ok = not any(error["nivel"] == "error" for error in reporte)
+    return todos_ok, reporte
+
+# Maestros que usa el cálculo de la cotización
+MAESTROS_CALCULO = [
+    "ma_region", "ma_ciudad", "ma_troncal", "ma_servicio", "ma_cargo_adicional",
+    "ma_tarifa_peso", "ma_costo_handling", "ma_costo_ultimamilla", "ma_tipo_entrega"
+]
+
+# Maestros grandes que se leen desde el almacén columnar en vez de desde Excel
+MAESTROS_COLUMNARES = ["ma_ciudad", "ma_agencia", "ma_dest_indirecto", "rl_matriz_sector"]
+
+def obtener_almacen_maestro(config: Configuracion, key: str) -> AlmacenColumnar:
+    """
+    Obtiene el almacén columnar de un maestro, construyéndolo desde el Excel si cambió.
+
+    Args:
+        config (Configuracion): Instancia de configuración con las rutas de los archivos.
+        key (str): Clave del maestro en `config.rutas`.
+
+    Returns:
+        AlmacenColumnar: Almacén con columnas en memoria mapeada, ya renombradas según la configuración.
+    """
+    return obtener_almacen(config.rutas[key], config.directorio_cache, config.mapeo_columnas.get(key))
+
+def cargar_columnas_maestro(config: Configuracion, key: str, columnas: list[str]) -> pd.DataFrame:
+    """
+    Carga solo algunas columnas de un maestro desde su almacén columnar.
+
+    Las columnas numéricas se comparten (sin copiar) entre procesos y sesiones; el DataFrame
+    devuelto es de solo lectura.
+
+    Args:
+        config (Configuracion): Instancia de configuración con las rutas de los archivos.
+        key (str): Clave del maestro en `config.rutas`.
+        columnas (list[str]): Columnas a cargar (nombres ya renombrados).
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas pedidas; las de texto como Categorical.
+    """
+    return obtener_almacen_maestro(config, key).cargar(columnas)
+
+def cargar_columnas_esquema(config: Configuracion, key: str) -> pd.DataFrame:
+    """
+    Carga desde el almacén columnar solo las columnas de un maestro que aparecen en su esquema.
+
+    Las columnas del esquema que no existen en el archivo se omiten, para que `validar_datos`
+    las informe como faltantes.
+
+    Args:
+        config (Configuracion): Instancia de configuración con las rutas de los archivos.
+        key (str): Clave del maestro en `config.rutas` y en `ESQUEMA_ARCHIVOS`.
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas del esquema presentes en el maestro.
+    """
+    almacen = obtener_almacen_maestro(config, key)
+    esquema = ESQUEMA_ARCHIVOS[key]["columnas"]
+    return almacen.cargar([col for col in almacen.columnas if col.upper().strip() in esquema])
+
+# Maestros ya leídos, por versión de los archivos
+_CACHE_MAESTROS: dict[tuple, dict[str, pd.DataFrame]] = {}
+
+def cargar_maestros(config: Configuracion) -> dict[str, pd.DataFrame]:
+    """
+    Lee los maestros del cálculo una sola vez por versión de los archivos.
+
+    Los DataFrames devueltos se comparten entre llamadas y no deben modificarse;
+    `cargar_archivos` entrega copias.
+
+    Args:
+        config (Configuracion): Instancia de configuración con las rutas de los archivos.
+
+    Returns:
+        dict[str, pd.DataFrame]: Diccionario con los maestros, con columnas ya renombradas según la configuración.
+    """
+    version = version_maestros([config.rutas[key] for key in MAESTROS_CALCULO])
+    if version not in _CACHE_MAESTROS:
+        maestros = {}
+        for key in MAESTROS_CALCULO:
+            if key in MAESTROS_COLUMNARES:
+                # Se evita leer el Excel y se cargan solo las columnas del esquema. Los enteros quedan
+                # reducidos y en memoria mapeada (el resultado los amplía en `calcular_resultados_envio`);
+                # los textos se decodifican porque el cálculo los normaliza y los entrega en el resultado
+                maestros[key] = cargar_columnas_esquema(config, key)
+                for col in maestros[key].select_dtypes("category").columns:
+                    maestros[key][col] = maestros[key][col].astype(object)
+                continue
+            maestros[key] = pd.read_excel(config.rutas[key])
+            # Renombrar columnas según el mapeo configurado (columna del archivo -> columna esperada)
+            if config.mapeo_columnas.get(key):
+                maestros[key] = maestros[key].rename(columns=config.mapeo_columnas[key])
+        _CACHE_MAESTROS.clear() # Solo se conserva la versión vigente
+        _CACHE_MAESTROS[version] = maestros
+    return _CACHE_MAESTROS[version]
+
 def cargar_archivos(config: Configuracion, cotizar_df_input: pd.DataFrame) -> dict[str, pd.DataFrame]:
     """
     Carga todos los DataFrames maestros y el DataFrame de cotización en un diccionario.
@@ -89,18 +547,13 @@ def cargar_archivos(config: Configuracion, cotizar_df_input: pd.DataFrame) -> di
     Returns:
         dict[str, pd.DataFrame]: Diccionario con todos los DataFrames cargados.
     """
-    archivos = {
-        "cotizar": cotizar_df_input.copy(), # Usamos la copia del DF de entrada
-        "ma_region": pd.read_excel(config.rutas["ma_region"]),
-        "ma_ciudad": pd.read_excel(config.rutas["ma_ciudad"]),
-        "ma_troncal": pd.read_excel(config.rutas["ma_troncal"]),
-        "ma_servicio": pd.read_excel(config.rutas["ma_servicio"]),
-        "ma_cargo_adicional": pd.read_excel(config.rutas["ma_cargo_adicional"]),
-        "ma_tarifa_peso": pd.read_excel(config.rutas["ma_tarifa_peso"]),
-        "ma_costo_handling": pd.read_excel(config.rutas["ma_costo_handling"]),
-        "ma_costo_ultimamilla": pd.read_excel(config.rutas["ma_costo_ultimamilla"]),
-        "ma_tipo_entrega": pd.read_excel(config.rutas["ma_tipo_entrega"])
-    }
+    archivos = {"cotizar": cotizar_df_input.copy()} # Usamos la copia del DF de entrada
+    if config.mapeo_columnas.get("cotizar"):
+        archivos["cotizar"] = archivos["cotizar"].rename(columns=config.mapeo_columnas["cotizar"])
+
+    # Copias de los maestros en caché, porque los pasos siguientes los modifican. Los del almacén
+    # columnar solo se leen, y se copia la estructura sin los datos en memoria mapeada
+    archivos.update({key: df.copy(deep=key not in MAESTROS_COLUMNARES) for key, df in cargar_maestros(config).items()})
     return archivos
 
 def preparar_datos(archivos: dict[str, pd.DataFrame], config: Configuracion) -> dict[str, pd.DataFrame]:
@@ -121,13 +574,14 @@ def preparar_datos(archivos: dict[str, pd.DataFrame], config: Configuracion) ->
 
     # Pre-procesamiento del DataFrame de cotización
     archivos['cotizar'].columns = archivos['cotizar'].columns.str.upper().str.strip()
-    archivos['cotizar']['PESO'] = pd.to_numeric(archivos['cotizar']['PESO'], errors='coerce').fillna(0) # Asegurar tipo numérico
 
-    # Validar que las columnas esperadas estén en el DataFrame de cotización
-    for col in COLUMNAS_COTIZACION_ENTRADA:
-        if col not in archivos['cotizar'].columns:
-            raise ValueError(f"La columna '{col}' no se encontró en el archivo de cotización. "
-                             f"Asegúrate de que el archivo 'Cotizar.xlsx' tenga las columnas correctas.")
+    # Validar que las columnas esperadas estén en el DataFrame de cotización (se informan todas juntas)
+    faltantes = [col for col in COLUMNAS_COTIZACION_ENTRADA if col not in archivos['cotizar'].columns]
+    if faltantes:
+        raise ValueError(f"Las columnas {faltantes} no se encontraron en el archivo de cotización. "
+                         f"Asegúrate de que el archivo 'Cotizar.xlsx' tenga las columnas correctas.")
+
+    archivos['cotizar']['PESO'] = pd.to_numeric(archivos['cotizar']['PESO'], errors='coerce').fillna(0) # Asegurar tipo numérico
 
     # Asegurar que 'MA_TARIFA_PESO' tenga las columnas necesarias y el tipo de dato correcto para 'PESO_KG'
     if 'PESO_KG' in archivos['ma_tarifa_peso'].columns:
@@ -221,6 +675,162 @@ def convertir_ciudades(archivos: dict[str, pd.DataFrame], config: Configuracion)
     archivos['cotizar'] = cotizar_df
     return archivos, origen_problemas[:10], destino_problemas[:10] # Limitar a 10 para no sobrecargar el mensaje
 
+def version_maestros(rutas: list[str]) -> tuple:
+    """
+    Calcula una firma de versión para un conjunto de archivos maestros.
+
+    La firma cambia cuando cualquiera de los archivos es modificado, reemplazado o eliminado,
+    por lo que sirve como clave para cachear estructuras derivadas de los maestros.
+
+    Args:
+        rutas (list[str]): Rutas de los archivos maestros.
+
+    Returns:
+        tuple: Tupla con (nombre, mtime_ns, tamaño) por archivo.
+    """
+    firma = []
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            stat = os.stat(ruta)
+            firma.append((os.path.basename(ruta), stat.st_mtime_ns, stat.st_size))
+        else:
+            firma.append((os.path.basename(ruta), None, None))
+    return tuple(firma)
+
+
+class IndiceAgencias:
+    """Índice de cobertura de agencias por ciudad y comuna, construido desde MA_AGENCIA."""
+    def __init__(self, ma_agencia: pd.DataFrame, ma_dest_indirecto: pd.DataFrame):
+        agencias = ma_agencia.copy(deep=False)
+        agencias.columns = agencias.columns.str.upper().str.strip()
+        agencias = agencias[COLUMNAS_INDICE_AGENCIAS]
+
+        # Solo se consideran agencias con ventana de operación definida
+        operativa = agencias['AGENINIOPERACION'].notna() & agencias['AGENFINOPERACION'].notna()
+        agencias = agencias[operativa]
+
+        # Agencia que atiende cada ciudad/comuna: primero la central, luego el menor código
+        agencias = agencias.sort_values(['AGENESCENTRAL', 'AGENCODIGO'], ascending=[False, True])
+        self.agencias = agencias.set_index('AGENCODIGO')
+        self.por_ciudad = agencias.drop_duplicates('CIUDCODIGO').set_index('CIUDCODIGO')['AGENCODIGO']
+        comunas = agencias[agencias['COMUCODIGO'] != 0] # 0 = comuna no informada
+        self.por_comuna = comunas.drop_duplicates('COMUCODIGO').set_index('COMUCODIGO')['AGENCODIGO']
+
+        # Destinos indirectos: ciudades sin agencia propia atendidas desde una agencia base
+        indirectos = ma_dest_indirecto.copy(deep=False)
+        indirectos.columns = indirectos.columns.str.upper().str.strip()
+        indirectos = indirectos.drop_duplicates('CIUDCODIGO')
+        self.indirecto_por_ciudad = indirectos.set_index('CIUDCODIGO')['AGENCODIGOBASE']
+
+    def resolver(self, codigos: pd.Series, nivel: str = "ciudad", permitir_indirecto: bool = True) -> pd.DataFrame:
+        """
+        Resuelve en bloque la agencia que atiende cada código de ciudad o comuna.
+
+        Args:
+            codigos (pd.Series): Códigos de ciudad (CIUDCODIGO) o comuna (COMUCODIGO).
+            nivel (str): "ciudad" o "comuna".
+            permitir_indirecto (bool): Si es True, las ciudades sin agencia propia se resuelven
+                                       con la agencia base de MA_DEST_INDIRECTO_NUEVO.
+
+        Returns:
+            pd.DataFrame: DataFrame alineado con `codigos` con las columnas 'ID_AGENCIA'
+                          (NaN si no hay cobertura) y 'ENTREGA_INDIRECTA' (bool).
+        """
+        if nivel == "ciudad":
+            directa = codigos.map(self.por_ciudad)
+        elif nivel == "comuna":
+            directa = codigos.map(self.por_comuna)
+        else:
+            raise ValueError(f"Nivel '{nivel}' no soportado. Usa 'ciudad' o 'comuna'.")
+
+        indirecta = pd.Series(False, index=codigos.index)
+        if permitir_indirecto and nivel == "ciudad":
+            base = codigos.map(self.indirecto_por_ciudad)
+            indirecta = directa.isnull() & base.notnull()
+            directa = directa.fillna(base)
+
+        return pd.DataFrame({'ID_AGENCIA': directa, 'ENTREGA_INDIRECTA': indirecta}, index=codigos.index)
+
+
+# Índices de agencias ya construidos, por versión de los maestros
+_CACHE_INDICE_AGENCIAS: dict[tuple, IndiceAgencias] = {}
+
+# Cachés derivadas y prefijos de las opciones de configuración de las que dependen
+CACHES_DERIVADAS = {
+    "maestros": (_CACHE_MAESTROS, ["datos.base_path", "maestros"]),
+    "indice_agencias": (_CACHE_INDICE_AGENCIAS, ["datos.base_path", "maestros.ma_agencia", "maestros.ma_dest_indirecto"])
+}
+
+def invalidar_caches(claves_cambiadas: list[str]) -> list[str]:
+    """
+    Vacía las cachés derivadas que dependen de alguna de las opciones de configuración modificadas.
+
+    Args:
+        claves_cambiadas (list[str]): Opciones modificadas (claves con puntos).
+
+    Returns:
+        list[str]: Nombres de las cachés invalidadas.
+    """
+    invalidadas = []
+    for nombre, (cache, dependencias) in CACHES_DERIVADAS.items():
+        if any(clave == dep or clave.startswith(f"{dep}.") for clave in claves_cambiadas for dep in dependencias):
+            cache.clear()
+            invalidadas.append(nombre)
+    return invalidadas
+
+def obtener_indice_agencias(config: Configuracion) -> IndiceAgencias:
+    """
+    Obtiene el índice de agencias, construyéndolo solo una vez por versión de los maestros.
+
+    Args:
+        config (Configuracion): Instancia de configuración con las rutas de los archivos.
+
+    Returns:
+        IndiceAgencias: Índice de cobertura de agencias.
+    """
+    rutas = [config.rutas["ma_agencia"], config.rutas["ma_dest_indirecto"]]
+    version = version_maestros(rutas)
+    if version not in _CACHE_INDICE_AGENCIAS:
+        _CACHE_INDICE_AGENCIAS.clear() # Solo se conserva la versión vigente
+        _CACHE_INDICE_AGENCIAS[version] = IndiceAgencias(
+            cargar_columnas_maestro(config, "ma_agencia", COLUMNAS_INDICE_AGENCIAS),
+            cargar_columnas_maestro(config, "ma_dest_indirecto", ['CIUDCODIGO', 'AGENCODIGOBASE'])
+        )
+    return _CACHE_INDICE_AGENCIAS[version]
+
+def asignar_agencias(archivos: dict[str, pd.DataFrame], indice: IndiceAgencias) -> tuple[dict[str, pd.DataFrame], list[str], list[str]]:
+    """
+    Asigna la agencia que atiende el origen y el destino de cada envío y valida la cobertura.
+
+    El origen debe contar con una agencia operativa propia; el destino puede resolverse
+    mediante entrega indirecta desde una agencia base.
+
+    Args:
+        archivos (dict): Diccionario de DataFrames, con ciudades ya convertidas a IDs.
+        indice (IndiceAgencias): Índice de cobertura de agencias.
+
+    Returns:
+        tuple[dict, list, list]: Diccionario de DataFrames actualizado, y listas de comunas de
+                                 origen y destino sin cobertura.
+    """
+    cotizar_df = archivos['cotizar']
+
+    origen = indice.resolver(cotizar_df['ID_CIUDAD_ORIGEN'], permitir_indirecto=False)
+    destino = indice.resolver(cotizar_df['ID_CIUDAD_DESTINO'])
+
+    cotizar_df['ID_AGENCIA_ORIGEN'] = origen['ID_AGENCIA']
+    cotizar_df['ID_AGENCIA_DESTINO'] = destino['ID_AGENCIA']
+    cotizar_df['ENTREGA INDIRECTA'] = destino['ENTREGA_INDIRECTA']
+
+    # Identificar problemas de cobertura (solo para ciudades ya mapeadas)
+    sin_origen = origen['ID_AGENCIA'].isnull() & cotizar_df['ID_CIUDAD_ORIGEN'].notnull()
+    sin_destino = destino['ID_AGENCIA'].isnull() & cotizar_df['ID_CIUDAD_DESTINO'].notnull()
+    origen_problemas = cotizar_df.loc[sin_origen, 'COMUNA ORIGEN'].unique().tolist()
+    destino_problemas = cotizar_df.loc[sin_destino, 'COMUNA DESTINO'].unique().tolist()
+
+    archivos['cotizar'] = cotizar_df
+    return archivos, origen_problemas[:10], destino_problemas[:10] # Limitar a 10 para no sobrecargar el mensaje
+
 def procesar_cotizaciones(archivos: dict[str, pd.DataFrame]) -> pd.DataFrame:
     """
     Procesa las cotizaciones, uniendo con maestros y calculando valores.
@@ -257,13 +867,8 @@ def procesar_cotizaciones(archivos: dict[str, pd.DataFrame]) -> pd.DataFrame:
     ).rename(columns={'ID_TIPO_ENTREGA_lookup': 'ID_TIPO_ENTREGA'})
 
     # --- Calcular VALOR TARIFA CLIENTE ---
-    # Unir para obtener la tarifa base por tarifario
-    cotizar_df = pd.merge(
-        cotizar_df,
-        ma_tarifa_peso_df[['TARIFARIO', 'PESO_KG', 'VALOR_KG']].rename(columns={'PESO_KG': 'PESO_KG_lookup'}),
-        on='TARIFARIO',
-        how='left'
-    )
+    # La tarifa se busca por envío en MA_TARIFA_PESO; no se une por TARIFARIO porque esa unión
+    # multiplicaba cada envío por la cantidad de tramos de peso de su tarifario
 
     # Filtrar para encontrar el VALOR_KG correcto según el peso del envío
     def get_valor_tarifa(row):
@@ -290,7 +895,7 @@ def procesar_cotizaciones(archivos: dict[str, pd.DataFrame]) -> pd.DataFrame:
 
     cotizar_df['VALOR_KG_APLICADO'] = cotizar_df.apply(get_valor_tarifa, axis=1)
     cotizar_df['VALOR TARIFA CLIENTE'] = cotizar_df['VALOR_KG_APLICADO'] * cotizar_df['PESO']
-    cotizar_df.drop(columns=['VALOR_KG_APLICADO', 'PESO_KG_lookup'], inplace=True) # Limpiar columnas auxiliares
+    cotizar_df.drop(columns=['VALOR_KG_APLICADO'], inplace=True) # Limpiar columnas auxiliares
 
     # --- Calcular CARGO ADICIONAL ---
     # Unir con MA_CARGO_ADICIONAL usando ID_SERVICIO y ID_TIPO_ENTREGA
@@ -315,9 +920,8 @@ def procesar_cotizaciones(archivos: dict[str, pd.DataFrame]) -> pd.DataFrame:
     cotizar_df['KM_RECORRIDO'] = cotizar_df['KM_RECORRIDO'].fillna(0)
     cotizar_df.drop(columns=['COSTO_TRONCAL'], inplace=True)
 
-    # --- Calcular COSTO PRIMERA MILLA ---
-    # Este es un costo fijo por envío que se sumará al costo variable total
-    cotizar_df['COSTO PRIMERA MILLA'] = COSTO_PRIMERA_MILLA_FIJO / len(cotizar_df) if len(cotizar_df) > 0 else 0
+    # El COSTO PRIMERA MILLA es un costo fijo: se reparte en `asignar_costos_fijos`, una vez
+    # que el conjunto de filas es definitivo
 
     # --- Calcular VALOR NETO (Ingreso Bruto) ---
     cotizar_df['VALOR NETO'] = cotizar_df['VALOR TARIFA CLIENTE'] + cotizar_df['CARGO ADICIONAL']
@@ -375,16 +979,161 @@ def calcular_costo_ultimamilla_final(df: pd.DataFrame, ma_costo_ultimamilla: pd.
     df.drop(columns=['ID_REGION_LOOKUP', 'ID_CIUDAD_LOOKUP', 'COSTO_ULTIMAMILLA_LOOKUP'], inplace=True)
     return df
 
-def preparar_dataframe_para_exportar(df: pd.DataFrame, nombre_empresa: str) -> tuple[pd.DataFrame, dict]:
+def totales_asignacion(df: pd.DataFrame) -> dict[str, float]:
     """
-    Calcula los totales y prepara el DataFrame final para exportación, incluyendo un resumen.
+    Calcula los totales parciales de cada base de asignación para un bloque de envíos.
+
+    Los totales de varios bloques se combinan sumándolos con `combinar_totales`.
 
     Args:
-        df (pd.DataFrame): DataFrame procesado.
-        nombre_empresa (str): Nombre de la empresa para el resumen.
+        df (pd.DataFrame): Bloque de envíos ya calculados (con PESO y KM_RECORRIDO).
 
     Returns:
-        tuple[pd.DataFrame, dict]: DataFrame final para exportar y un diccionario de valores de resumen.
+        dict[str, float]: Total de cada clave de asignación ("envio", "peso", "km").
+    """
+    totales = {}
+    for clave, columna in BASES_ASIGNACION.items():
+        totales[clave] = float(len(df)) if columna is None else float(df[columna].fillna(0).sum())
+    return totales
+
+def combinar_totales(parciales: list[dict[str, float]]) -> dict[str, float]:
+    """
+    Combina los totales de asignación de varios bloques.
+
+    Args:
+        parciales (list[dict]): Totales entregados por `totales_asignacion` para cada bloque.
+
+    Returns:
+        dict[str, float]: Totales globales por clave de asignación.
+    """
+    return {clave: sum(parcial[clave] for parcial in parciales) for clave in BASES_ASIGNACION}
+
+def asignar_costos_fijos(df: pd.DataFrame, totales: dict[str, float], costos_fijos: dict[str, float] = None,
+                         claves: dict[str, str] = None) -> pd.DataFrame:
+    """
+    Reparte los costos fijos entre los envíos según su clave de asignación.
+
+    Se aplica sobre el conjunto de filas definitivo. Como usa los totales globales, el resultado
+    es el mismo si se aplica a todo el DataFrame o bloque por bloque.
+
+    Args:
+        df (pd.DataFrame): Envíos calculados (todos o un bloque).
+        totales (dict[str, float]): Totales globales de asignación (ver `combinar_totales`).
+        costos_fijos (dict[str, float], optional): Monto por columna de costo. Por defecto `COSTOS_FIJOS`.
+        claves (dict[str, str], optional): Clave por columna de costo. Por defecto `CLAVES_ASIGNACION_COSTOS_FIJOS`.
+
+    Returns:
+        pd.DataFrame: DataFrame con una columna por costo fijo asignado.
+    """
+    costos_fijos = COSTOS_FIJOS if costos_fijos is None else costos_fijos
+    claves = CLAVES_ASIGNACION_COSTOS_FIJOS if claves is None else claves
+
+    for columna_costo, monto in costos_fijos.items():
+        clave = claves.get(columna_costo, "envio")
+        if clave not in BASES_ASIGNACION:
+            raise ValueError(f"Clave de asignación '{clave}' no soportada para '{columna_costo}'. "
+                             f"Usa una de {list(BASES_ASIGNACION)}.")
+        if totales.get(clave, 0) <= 0:
+            clave = "envio" # Sin base para repartir (ej. todos los km en 0): se reparte por envío
+
+        if totales["envio"] <= 0:
+            df[columna_costo] = 0.0
+            continue
+
+        columna_base = BASES_ASIGNACION[clave]
+        base = 1.0 if columna_base is None else df[columna_base].fillna(0)
+        df[columna_costo] = monto * base / totales[clave]
+    return df
+
+def _calcular_bloque(bloque: pd.DataFrame, maestros: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Calcula tarifas y costos variables de un bloque de envíos."""
+    df = procesar_cotizaciones(dict(maestros, cotizar=bloque))
+    df = calcular_costo_handling_final(df, maestros['ma_costo_handling'])
+    df = calcular_costo_ultimamilla_final(df, maestros['ma_costo_ultimamilla'])
+    return df
+
+# Maestros disponibles en cada proceso de trabajo (se envían una sola vez por proceso)
+_MAESTROS_PROCESO: dict[str, pd.DataFrame] = {}
+
+def _inicializar_proceso(maestros: dict[str, pd.DataFrame], config: Configuracion,
+                         columnares: dict[str, list[str]]) -> None:
+    _MAESTROS_PROCESO.update(maestros)
+    # Los maestros del almacén columnar no se envían: cada proceso abre el almacén en memoria mapeada
+    for key, columnas in columnares.items():
+        df = cargar_columnas_maestro(config, key, columnas)
+        for col in df.select_dtypes("category").columns:
+            df[col] = df[col].astype(object)
+        df.columns = df.columns.str.upper().str.strip() # Igual que en `preparar_datos`
+        _MAESTROS_PROCESO[key] = df
+
+def _calcular_bloque_en_proceso(bloque: pd.DataFrame) -> pd.DataFrame:
+    return _calcular_bloque(bloque, _MAESTROS_PROCESO)
+
+def calcular_cotizacion(archivos: dict[str, pd.DataFrame], config: Configuracion = None, tamano_bloque: int = None,
+                        n_procesos: int = None) -> pd.DataFrame:
+    """
+    Calcula la cotización completa: tarifas, costos variables y asignación de costos fijos.
+
+    Puede trabajar en serie, por bloques o en paralelo; los costos fijos se reparten siempre con
+    los totales globales, por lo que el resultado no depende del modo.
+
+    Args:
+        archivos (dict): Diccionario de DataFrames preparados y con ciudades convertidas.
+        config (Configuracion, optional): Configuración con costos fijos y opciones del motor. Por
+                                          defecto se usan las constantes del módulo.
+        tamano_bloque (int, optional): Cantidad de envíos por bloque. Por defecto el de la configuración;
+                                       sin configuración se procesa todo junto.
+        n_procesos (int, optional): Procesos en paralelo para calcular los bloques. Por defecto el de
+                                    la configuración, o 1.
+
+    Returns:
+        pd.DataFrame: DataFrame con todos los envíos calculados.
+    """
+    if config is not None:
+        tamano_bloque = config.tamano_bloque if tamano_bloque is None else tamano_bloque
+        n_procesos = config.n_procesos if n_procesos is None else n_procesos
+    n_procesos = n_procesos or 1
+
+    cotizar_df = archivos['cotizar']
+    maestros = {key: df for key, df in archivos.items() if key != 'cotizar'}
+
+    if tamano_bloque and len(cotizar_df) > tamano_bloque:
+        bloques = [cotizar_df.iloc[i:i + tamano_bloque] for i in range(0, len(cotizar_df), tamano_bloque)]
+    else:
+        bloques = [cotizar_df]
+
+    if n_procesos > 1 and len(bloques) > 1:
+        from concurrent.futures import ProcessPoolExecutor # Solo se importa si se usa el modo paralelo
+        columnares = {}
+        if config is not None:
+            for key in MAESTROS_COLUMNARES:
+                if key in maestros:
+                    almacen = obtener_almacen_maestro(config, key)
+                    columnares[key] = [col for col in almacen.columnas if col.upper().strip() in maestros[key].columns]
+        maestros_enviados = {key: df for key, df in maestros.items() if key not in columnares}
+        with ProcessPoolExecutor(max_workers=n_procesos, initializer=_inicializar_proceso,
+                                 initargs=(maestros_enviados, config, columnares)) as executor:
+            resultados = list(executor.map(_calcular_bloque_en_proceso, bloques))
+    else:
+        resultados = [_calcular_bloque(bloque, maestros) for bloque in bloques]
+
+    # Repartir costos fijos con los totales de todos los bloques
+    totales = combinar_totales([totales_asignacion(df) for df in resultados])
+    costos_fijos = None if config is None else config.costos_fijos
+    claves = None if config is None else config.claves_asignacion
+    resultados = [asignar_costos_fijos(df, totales, costos_fijos, claves) for df in resultados]
+
+    return pd.concat(resultados, ignore_index=True)
+
+def calcular_resultados_envio(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Selecciona las columnas finales y calcula costo total, utilidad y margen por envío.
+
+    Args:
+        df (pd.DataFrame): DataFrame procesado (completo o un bloque).
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas de `COLUMNAS_RESULTADO_FINAL`.
     """
     # Asegurar que todas las columnas esperadas estén presentes
     for col in COLUMNAS_RESULTADO_FINAL:
@@ -392,11 +1141,17 @@ def preparar_dataframe_para_exportar(df: pd.DataFrame, nombre_empresa: str) -> t
             df[col] = np.nan # Añadir columnas faltantes con NaN
 
     # Ordenar y seleccionar solo las columnas finales
-    df_final = df[COLUMNAS_RESULTADO_FINAL]
+    df_final = df[COLUMNAS_RESULTADO_FINAL].copy()
+
+    # Los códigos que vienen del almacén columnar usan enteros reducidos; el resultado usa int64,
+    # como si los maestros se hubieran leído con read_excel
+    for col in df_final.select_dtypes(["int8", "int16", "int32"]).columns:
+        df_final[col] = df_final[col].astype(np.int64)
 
     # Calcular Costo Total por envío
     df_final['COSTO TOTAL'] = df_final['COSTO TRONCAL'] + df_final['COSTO PRIMERA MILLA'] + \
-                              df_final['COSTO ULTIMA MILLA'] + df_final['COSTO HANDLING']
+                              df_final['COSTO ULTIMA MILLA'] + df_final['COSTO HANDLING'] + \
+                              df_final['COSTO INHOUSE']
 
     # Calcular Utilidad Neta
     df_final['UTILIDAD NETA'] = (
@@ -415,29 +1170,62 @@ def preparar_dataframe_para_exportar(df: pd.DataFrame, nombre_empresa: str) -> t
     )
     df_final['MARGEN %'] = df_final['MARGEN %'].fillna(0) # Manejar división por cero
 
-    # --- Calcular valores de resumen para la segunda hoja del Excel ---
-    total_envios = len(df_final)
-    total_valor_tarifa_cliente = df_final['VALOR TARIFA CLIENTE'].sum()
-    total_cargo_adicional = df_final['CARGO ADICIONAL'].sum()
-    total_costo_handling = df_final['VALOR HANDLING'].sum() # Ingreso por handling
-    total_costo_ultimamilla = df_final['VALOR ULTIMA MILLA'].sum() # Ingreso por última milla
+    return df_final
+
+# Sumas parciales que componen el resumen: clave del resumen -> columna del resultado
+SUMAS_RESUMEN = {
+    'total_valor_tarifa_cliente': 'VALOR TARIFA CLIENTE',
+    'total_cargo_adicional': 'CARGO ADICIONAL',
+    'total_costo_handling': 'VALOR HANDLING', # Ingreso por handling
+    'total_costo_ultimamilla': 'VALOR ULTIMA MILLA', # Ingreso por última milla
+    'total_costo_troncal': 'COSTO TRONCAL',
+    'total_costo_primera_milla': 'COSTO PRIMERA MILLA',
+    'total_costo_ultimamilla_costo': 'COSTO ULTIMA MILLA', # Costo por última milla
+    'total_costo_handling_costo': 'COSTO HANDLING', # Costo por handling
+    'costo_inhouse_fijo': 'COSTO INHOUSE',
+    'suma_peso': 'PESO',
+    'suma_recorrido': 'KM_RECORRIDO'
+}
+
+def resumen_parcial(df_final: pd.DataFrame) -> dict[str, float]:
+    """
+    Calcula las sumas parciales del resumen para un bloque de resultados.
+
+    Args:
+        df_final (pd.DataFrame): Bloque de resultados entregado por `calcular_resultados_envio`.
+
+    Returns:
+        dict[str, float]: Cantidad de envíos y sumas por concepto, combinables con `combinar_resumenes`.
+    """
+    parcial = {clave: df_final[columna].sum() for clave, columna in SUMAS_RESUMEN.items()}
+    parcial['total_envios'] = len(df_final)
+    return parcial
+
+def combinar_resumenes(parciales: list[dict[str, float]], nombre_empresa: str) -> dict:
+    """
+    Combina las sumas parciales de uno o más bloques en el resumen final de la cotización.
 
-    ingreso_bruto_mensual = (total_valor_tarifa_cliente + total_cargo_adicional +
-                            total_costo_handling + total_costo_ultimamilla)
+    Args:
+        parciales (list[dict]): Sumas entregadas por `resumen_parcial` para cada bloque.
+        nombre_empresa (str): Nombre de la empresa para el resumen.
+
+    Returns:
+        dict: Diccionario de valores de resumen.
+    """
+    totales = {clave: sum(parcial[clave] for parcial in parciales) for clave in list(SUMAS_RESUMEN) + ['total_envios']}
+    total_envios = totales['total_envios']
 
-    total_costo_troncal = df_final['COSTO TRONCAL'].sum()
-    total_costo_primera_milla = df_final['COSTO PRIMERA MILLA'].sum()
-    total_costo_ultimamilla_costo = df_final['COSTO ULTIMA MILLA'].sum() # Costo por última milla
-    total_costo_handling_costo = df_final['COSTO HANDLING'].sum() # Costo por handling
+    ingreso_bruto_mensual = (totales['total_valor_tarifa_cliente'] + totales['total_cargo_adicional'] +
+                            totales['total_costo_handling'] + totales['total_costo_ultimamilla'])
 
-    costo_total_variable = (total_costo_troncal + total_costo_primera_milla +
-                            total_costo_ultimamilla_costo + total_costo_handling_costo)
+    costo_total_variable = (totales['total_costo_troncal'] + totales['total_costo_primera_milla'] +
+                            totales['total_costo_ultimamilla_costo'] + totales['total_costo_handling_costo'])
 
-    utilidad_mensual = ingreso_bruto_mensual - costo_total_variable - COSTO_INHOUSE_FIJO
+    utilidad_mensual = ingreso_bruto_mensual - costo_total_variable - totales['costo_inhouse_fijo']
     margen_porcentaje = utilidad_mensual / ingreso_bruto_mensual if ingreso_bruto_mensual != 0 else 0
 
-    peso_promedio = df_final['PESO'].mean() if total_envios > 0 else 0
-    recorrido_promedio = df_final['KM_RECORRIDO'].mean() if total_envios > 0 else 0
+    peso_promedio = totales['suma_peso'] / total_envios if total_envios > 0 else 0
+    recorrido_promedio = totales['suma_recorrido'] / total_envios if total_envios > 0 else 0
 
     resumen_valores = {
         'nombre_empresa': nombre_empresa,
@@ -445,23 +1233,316 @@ def preparar_dataframe_para_exportar(df: pd.DataFrame, nombre_empresa: str) -> t
         'total_envios': total_envios,
         'peso_promedio': round(peso_promedio, 2),
         'recorrido_promedio': round(recorrido_promedio, 2),
-        'total_valor_tarifa_cliente': total_valor_tarifa_cliente,
-        'total_cargo_adicional': total_cargo_adicional,
-        'total_costo_handling': total_costo_handling,
-        'total_costo_ultimamilla': total_costo_ultimamilla,
+        'total_valor_tarifa_cliente': totales['total_valor_tarifa_cliente'],
+        'total_cargo_adicional': totales['total_cargo_adicional'],
+        'total_costo_handling': totales['total_costo_handling'],
+        'total_costo_ultimamilla': totales['total_costo_ultimamilla'],
         'ingreso_bruto_mensual': ingreso_bruto_mensual,
-        'total_costo_troncal': total_costo_troncal,
-        'total_costo_primera_milla': total_costo_primera_milla,
-        'total_costo_ultimamilla_costo': total_costo_ultimamilla_costo,
-        'total_costo_handling_costo': total_costo_handling_costo,
+        'total_costo_troncal': totales['total_costo_troncal'],
+        'total_costo_primera_milla': totales['total_costo_primera_milla'],
+        'total_costo_ultimamilla_costo': totales['total_costo_ultimamilla_costo'],
+        'total_costo_handling_costo': totales['total_costo_handling_costo'],
         'costo_total_variable': costo_total_variable,
-        'costo_inhouse_fijo': COSTO_INHOUSE_FIJO,
+        'costo_inhouse_fijo': totales['costo_inhouse_fijo'],
         'utilidad_mensual': utilidad_mensual,
         'margen_porcentaje': margen_porcentaje
     }
 
+    return resumen_valores
+
+# Tramos de peso (kg) para el análisis de rentabilidad; cada tramo incluye su límite superior
+TRAMOS_PESO_KG = [0, 3, 6, 10, 15, 25, 50, 100, np.inf]
+
+# Cubos de rentabilidad: nombre -> dimensiones de agrupación
+CUBOS_RENTABILIDAD = {
+    "Cubo Lanes": ["REGION ORIGEN", "REGION DESTINO"],
+    "Cubo Tarifario": ["TARIFARIO"],
+    "Cubo Tramo Peso": ["TRAMO PESO"],
+    "Cubo Servicio": ["TIPO SERVICIO"]
+}
+
+# Medidas sumables de cada celda de los cubos
+MEDIDAS_CUBO = ["ENVIOS", "PESO", "INGRESO", "COSTO TOTAL", "UTILIDAD NETA"]
+
+def _etiquetas_tramos(limites: list[float]) -> list[str]:
+    return [f"{inf:g}-{sup:g} kg" if np.isfinite(sup) else f"> {inf:g} kg" for inf, sup in zip(limites[:-1], limites[1:])]
+
+def cubo_base_parcial(df_final: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agrega un bloque de resultados al nivel más fino de todas las dimensiones de los cubos.
+
+    Se hace un solo groupby ordenado; los cubos se obtienen después agregando este resultado,
+    que es mucho más pequeño que el detalle. Los parciales de varios bloques se combinan con
+    `combinar_cubos_base`.
+
+    Args:
+        df_final (pd.DataFrame): Bloque de resultados entregado por `calcular_resultados_envio`.
+
+    Returns:
+        pd.DataFrame: Sumas de `MEDIDAS_CUBO` por combinación de dimensiones.
+    """
+    dimensiones = list(dict.fromkeys(dim for dims in CUBOS_RENTABILIDAD.values() for dim in dims))
+    base = pd.DataFrame({
+        "REGION ORIGEN": df_final["REGION ORIGEN"],
+        "REGION DESTINO": df_final["REGION DESTINO"],
+        "TARIFARIO": df_final["TARIFARIO"],
+        "TRAMO PESO": pd.cut(df_final["PESO"], TRAMOS_PESO_KG, labels=_etiquetas_tramos(TRAMOS_PESO_KG)).astype(object),
+        "TIPO SERVICIO": df_final["TIPO SERVICIO"],
+        "ENVIOS": 1,
+        "PESO": df_final["PESO"],
+        "INGRESO": (df_final["VALOR TARIFA CLIENTE"] + df_final["CARGO ADICIONAL"] +
+                    df_final["VALOR HANDLING"] + df_final["VALOR ULTIMA MILLA"]),
+        "COSTO TOTAL": df_final["COSTO TOTAL"],
+        "UTILIDAD NETA": df_final["UTILIDAD NETA"]
+    })
+    return base.groupby(dimensiones, sort=True, dropna=False)[MEDIDAS_CUBO].sum().reset_index()
+
+def combinar_cubos_base(parciales: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combina los cubos base de varios bloques.
+
+    Args:
+        parciales (list[pd.DataFrame]): Cubos base entregados por `cubo_base_parcial`.
+
+    Returns:
+        pd.DataFrame: Cubo base global.
+    """
+    dimensiones = [col for col in parciales[0].columns if col not in MEDIDAS_CUBO]
+    return pd.concat(parciales, ignore_index=True).groupby(dimensiones, sort=True, dropna=False)[MEDIDAS_CUBO].sum().reset_index()
+
+def calcular_cubos(cubo_base: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Calcula los cubos de rentabilidad a partir del cubo base, incluyendo el margen de cada celda.
+
+    Args:
+        cubo_base (pd.DataFrame): Cubo base (ver `cubo_base_parcial` y `combinar_cubos_base`).
+
+    Returns:
+        dict[str, pd.DataFrame]: Un DataFrame por cubo de `CUBOS_RENTABILIDAD`, ordenado por utilidad ascendente
+                                 para mostrar primero las celdas que pierden dinero.
+    """
+    cubos = {}
+    for nombre, dimensiones in CUBOS_RENTABILIDAD.items():
+        cubo = cubo_base.groupby(dimensiones, sort=True, dropna=False)[MEDIDAS_CUBO].sum().reset_index()
+        cubo["MARGEN %"] = (cubo["UTILIDAD NETA"] / cubo["INGRESO"]).replace([np.inf, -np.inf], np.nan).fillna(0)
+        cubos[nombre] = cubo.sort_values("UTILIDAD NETA", kind="stable").reset_index(drop=True)
+    return cubos
+
+def guardar_cubos_parquet(cubos: dict[str, pd.DataFrame], directorio: str) -> list[str]:
+    """
+    Guarda cada cubo como archivo Parquet (requiere pyarrow).
+
+    Args:
+        cubos (dict[str, pd.DataFrame]): Cubos entregados por `calcular_cubos`.
+        directorio (str): Carpeta de destino.
+
+    Returns:
+        list[str]: Rutas de los archivos generados.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    rutas = []
+    for nombre, cubo in cubos.items():
+        ruta = os.path.join(directorio, f"{nombre.lower().replace(' ', '_')}.parquet")
+        cubo.to_parquet(ruta, index=False)
+        rutas.append(ruta)
+    return rutas
+
+def preparar_dataframe_para_exportar(df: pd.DataFrame, nombre_empresa: str) -> tuple[pd.DataFrame, dict]:
+    """
+    Calcula los totales y prepara el DataFrame final para exportación, incluyendo un resumen.
+
+    Args:
+        df (pd.DataFrame): DataFrame procesado, con los costos fijos ya asignados.
+        nombre_empresa (str): Nombre de la empresa para el resumen.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: DataFrame final para exportar y un diccionario de valores de resumen.
+    """
+    df_final = calcular_resultados_envio(df)
+    resumen_valores = combinar_resumenes([resumen_parcial(df_final)], nombre_empresa)
     return df_final, resumen_valores
 
+def evaluar_cotizacion(config: Configuracion, cotizar_df_input: pd.DataFrame, nombre_empresa: str,
+                       n_procesos: int = None) -> tuple[pd.DataFrame, dict, list[str]]:
+    """
+    Ejecuta el flujo completo de evaluación de una cotización, sin interfaz.
+
+    Args:
+        config (Configuracion): Instancia de configuración.
+        cotizar_df_input (pd.DataFrame): DataFrame de cotización tal como se leyó del Excel.
+        nombre_empresa (str): Nombre de la empresa para el resumen.
+        n_procesos (int, optional): Procesos para el cálculo. Por defecto el de la configuración.
+
+    Returns:
+        tuple[pd.DataFrame, dict, list[str]]: DataFrame final, valores de resumen y lista de advertencias.
+
+    Raises:
+        ValueError: Si la validación de los datos encuentra errores.
+    """
+    archivos = cargar_archivos(config, cotizar_df_input)
+
+    datos_ok, reporte = validar_datos(archivos, config)
+    if not datos_ok:
+        errores = [e for e in reporte if e['nivel'] == 'error']
+        detalle = "; ".join(f"{e['archivo']}: {e['mensaje']} ({e['total_filas']} filas)" for e in errores[:5])
+        raise ValueError(f"Se encontraron {len(errores)} problemas en los datos. {detalle}")
+
+    archivos = preparar_datos(archivos, config)
+    archivos, origen_problemas, destino_problemas = convertir_ciudades(archivos, config)
+    archivos, origen_sin_agencia, destino_sin_agencia = asignar_agencias(archivos, obtener_indice_agencias(config))
+
+    advertencias = []
+    if origen_problemas:
+        advertencias.append(f"Ciudades de ORIGEN no mapeadas: {', '.join(map(str, origen_problemas))}")
+    if destino_problemas:
+        advertencias.append(f"Ciudades de DESTINO no mapeadas: {', '.join(map(str, destino_problemas))}")
+    if origen_sin_agencia:
+        advertencias.append(f"Comunas de ORIGEN sin agencia operativa: {', '.join(map(str, origen_sin_agencia))}")
+    if destino_sin_agencia:
+        advertencias.append(f"Comunas de DESTINO sin cobertura: {', '.join(map(str, destino_sin_agencia))}")
+
+    resultados_df = calcular_cotizacion(archivos, config, n_procesos=n_procesos)
+    df_final, resumen_valores = preparar_dataframe_para_exportar(resultados_df, nombre_empresa)
+    return df_final, resumen_valores, advertencias
+
+def escribir_informe_excel(df_final: pd.DataFrame, resumen_valores: dict, destino,
+                           cubos: dict[str, pd.DataFrame] = None) -> None:
+    """
+    Escribe el informe de evaluación comercial: hoja de detalle, hoja de resumen y cubos de rentabilidad.
+
+    Args:
+        df_final (pd.DataFrame): DataFrame final entregado por `preparar_dataframe_para_exportar`.
+        resumen_valores (dict): Valores de resumen de la cotización.
+        destino: Ruta del archivo o buffer (ej. io.BytesIO) donde escribir el Excel.
+        cubos (dict[str, pd.DataFrame], optional): Cubos de `calcular_cubos`, uno por hoja adicional.
+    """
+    with pd.ExcelWriter(destino, engine='xlsxwriter') as writer:
+        df_final.to_excel(writer, sheet_name='Evaluacion Comercial', index=False)
+
+        # Hoja de resumen
+        worksheet_resumen = writer.book.add_worksheet('Resumen Cotizacion')
+        workbook = writer.book
+
+        # === DEFINICIÓN DE FORMATOS ===
+        header_merge_format = workbook.add_format({
+            'bold': True, 'align': 'center', 'valign': 'vcenter',
+            'bg_color': '#D9D9D9', 'border': 1
+        })
+        label_format = workbook.add_format({'align': 'left', 'valign': 'vcenter'})
+        value_format = workbook.add_format({'align': 'right', 'valign': 'vcenter'})
+        currency_value_format = workbook.add_format({
+            'align': 'right', 'valign': 'vcenter', 'num_format': '$#,##0'
+        })
+        percent_value_format = workbook.add_format({
+            'align': 'right', 'valign': 'vcenter', 'num_format': '0%'
+        })
+        total_label_format = workbook.add_format({
+            'bold': True, 'align': 'left', 'valign': 'vcenter', 'top': 1, 'bottom': 1
+        })
+        total_currency_format = workbook.add_format({
+            'bold': True, 'align': 'right', 'valign': 'vcenter',
+            'top': 1, 'bottom': 1, 'num_format': '$#,##0'
+        })
+        margin_format = workbook.add_format({
+            'bold': True, 'align': 'right', 'valign': 'vcenter',
+            'top': 1, 'bottom': 1, 'num_format': '0.0%'
+        })
+        sub_header_format = workbook.add_format({
+            'bold': True, 'align': 'right', 'valign': 'vcenter',
+            'bg_color': '#D9D9D9', 'top': 1, 'bottom': 1, 'left': 1, 'right': 1
+        })
+        ingreso_label_format = workbook.add_format({
+            'bold': True, 'align': 'left', 'valign': 'vcenter', 'top': 1
+        })
+        ingreso_value_format = workbook.add_format({
+            'bold': True, 'align': 'right', 'valign': 'vcenter', 'top': 1, 'num_format': '$#,##0'
+        })
+
+        # Ancho de columnas para la hoja de resumen
+        worksheet_resumen.set_column('A:A', 25)
+        worksheet_resumen.set_column('B:B', 15)
+        row_offset = 0
+
+        # === SECCIÓN COTIZACIÓN ===
+        worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Cotización', header_merge_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Envios Mensuales', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_envios'], value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Peso Promedio', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['peso_promedio'], value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Recorrido Promedio (km)', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['recorrido_promedio'], value_format)
+        row_offset += 2 # Espacio
+
+        # === SECCIÓN INGRESOS ===
+        worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Ingresos', header_merge_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Valor Base (Tarifa Cliente)', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_valor_tarifa_cliente'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Cargo Adicional', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_cargo_adicional'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Valor Handling', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_handling'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Valor Última Milla', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_ultimamilla'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Ingreso Bruto Mensual', ingreso_label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['ingreso_bruto_mensual'], ingreso_value_format)
+        row_offset += 2 # Espacio
+
+        # === SECCIÓN COSTOS VARIABLES ===
+        worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Costos Variables (Mensual)', header_merge_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Costo Troncal', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_troncal'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Costo Primera Milla', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_primera_milla'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Costo Última Milla', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_ultimamilla_costo'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Costo Handling', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_handling_costo'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Costo Total Variable', total_label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['costo_total_variable'], total_currency_format)
+        row_offset += 2 # Espacio
+
+        # === SECCIÓN COSTOS FIJOS ===
+        worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Costos Fijos (Mensual)', header_merge_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'InHouse', label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['costo_inhouse_fijo'], currency_value_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'Costo Total Fijo', total_label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['costo_inhouse_fijo'], total_currency_format)
+        row_offset += 2 # Espacio
+
+        # === SECCIÓN RESUMEN FINAL ===
+        worksheet_resumen.write(row_offset, 0, 'UTILIDAD', total_label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['utilidad_mensual'], total_currency_format)
+        row_offset += 1
+        worksheet_resumen.write(row_offset, 0, 'MARGEN (%)', total_label_format)
+        worksheet_resumen.write(row_offset, 1, resumen_valores['margen_porcentaje'], margin_format)
+
+        # === CUBOS DE RENTABILIDAD ===
+        cubo_moneda_format = workbook.add_format({'num_format': '$#,##0'})
+        cubo_margen_format = workbook.add_format({'num_format': '0.0%'})
+        for nombre, cubo in (cubos or {}).items():
+            cubo.to_excel(writer, sheet_name=nombre, index=False)
+            hoja = writer.sheets[nombre]
+            columnas = list(cubo.columns)
+            hoja.set_column(0, len(columnas) - 1, 16)
+            for col in ["INGRESO", "COSTO TOTAL", "UTILIDAD NETA"]:
+                hoja.set_column(columnas.index(col), columnas.index(col), 16, cubo_moneda_format)
+            hoja.set_column(columnas.index("MARGEN %"), columnas.index("MARGEN %"), 12, cubo_margen_format)
+
 def generar_nombre_archivo(nombre_empresa: str) -> str:
     """
     Genera un nombre de archivo para el informe de salida.
@@ -0,0 +1,203 @@
+"""
+Almacén columnar en disco para maestros grandes (RL_MATRIZ_SECTOR, MA_CIUDAD, MA_AGENCIA).
+
+Cada columna se guarda como un archivo `.npy` de ancho fijo: los enteros con el tipo más
+pequeño que los contiene y los textos codificados como enteros más un diccionario. Los
+archivos se abren con memoria mapeada en solo lectura, por lo que varios procesos y
+sesiones de Streamlit comparten una sola copia física a través de la caché de páginas
+del sistema operativo, y cada etapa carga solo las columnas que necesita.
+
+Las columnas de objetos que no son solo texto (por ejemplo, teléfonos que `read_excel` lee
+como int en unas filas y str en otras, u horas) se codifican igual, pero su diccionario
+conserva los valores originales de Python: se guarda serializado y se lee completo, sin
+memoria mapeada. Así, al decodificar, cada valor es igual al que entrega `read_excel`.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+ARCHIVO_MANIFIESTO = "manifiesto.json"
+
+# Cambia cuando cambia el formato de los archivos; los almacenes de otra versión se reconstruyen
+VERSION_ALMACEN = 2
+
+# Tipos enteros candidatos, del más pequeño al más grande
+TIPOS_ENTEROS = [np.int8, np.int16, np.int32, np.int64]
+
+
+def _version_archivo(ruta: str) -> list:
+    stat = os.stat(ruta)
+    return [os.path.abspath(ruta), stat.st_mtime_ns, stat.st_size]
+
+
+def _entero_minimo(valores: np.ndarray) -> np.ndarray:
+    """Convierte un arreglo entero al tipo más pequeño que contiene todos sus valores."""
+    if len(valores) == 0:
+        return valores.astype(np.int8)
+    minimo, maximo = valores.min(), valores.max()
+    for tipo in TIPOS_ENTEROS:
+        info = np.iinfo(tipo)
+        if info.min <= minimo and maximo <= info.max:
+            return valores.astype(tipo)
+    return valores
+
+
+def _nombre_archivo_columna(posicion: int) -> str:
+    # Se usa la posición y no el nombre, porque los nombres pueden tener espacios o tildes
+    return f"col_{posicion:03d}"
+
+
+def construir_almacen(ruta_excel: str, directorio: str, mapeo_columnas: dict[str, str] = None) -> None:
+    """
+    Convierte un maestro Excel en un almacén columnar.
+
+    Args:
+        ruta_excel (str): Ruta del archivo Excel del maestro.
+        directorio (str): Carpeta del almacén (se reemplaza completa).
+        mapeo_columnas (dict[str, str], optional): Renombre de columnas (columna del archivo -> columna esperada).
+    """
+    df = pd.read_excel(ruta_excel)
+    if mapeo_columnas:
+        df = df.rename(columns=mapeo_columnas)
+    df.columns = df.columns.astype(str)
+
+    # Se escribe en una carpeta temporal y se reemplaza al final, para que otro proceso nunca
+    # lea un almacén a medio construir
+    temporal = f"{directorio}.{os.getpid()}.tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    columnas = {}
+    for posicion, columna in enumerate(df.columns):
+        serie = df[columna]
+        archivo = _nombre_archivo_columna(posicion)
+        if pd.api.types.is_integer_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+            tipo = "entero"
+            np.save(os.path.join(temporal, f"{archivo}.npy"), _entero_minimo(serie.to_numpy(dtype=np.int64)))
+        elif pd.api.types.is_float_dtype(serie):
+            tipo = "decimal"
+            np.save(os.path.join(temporal, f"{archivo}.npy"), serie.to_numpy(dtype=np.float64))
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            tipo = "fecha"
+            np.save(os.path.join(temporal, f"{archivo}.npy"), serie.to_numpy(dtype="datetime64[ns]"))
+        else:
+            # Códigos enteros (-1 = vacío) y diccionario de valores: de ancho fijo si todos son
+            # texto; si no, con los objetos originales
+            codigos, categorias = pd.factorize(serie)
+            np.save(os.path.join(temporal, f"{archivo}.npy"), _entero_minimo(codigos))
+            if pd.api.types.infer_dtype(categorias, skipna=True) in ("string", "empty"):
+                tipo = "texto"
+                np.save(os.path.join(temporal, f"{archivo}.categorias.npy"), np.asarray(categorias, dtype=str))
+            else:
+                tipo = "objeto"
+                np.save(os.path.join(temporal, f"{archivo}.categorias.npy"), np.asarray(categorias, dtype=object))
+        columnas[columna] = {"archivo": archivo, "tipo": tipo}
+
+    manifiesto = {
+        "version": VERSION_ALMACEN,
+        "origen": _version_archivo(ruta_excel),
+        "mapeo_columnas": mapeo_columnas or {},
+        "filas": len(df),
+        "columnas": columnas
+    }
+    with open(os.path.join(temporal, ARCHIVO_MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+
+    shutil.rmtree(directorio, ignore_errors=True)
+    try:
+        os.replace(temporal, directorio)
+    except OSError:
+        # Otro proceso terminó de construir el mismo almacén primero
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+class AlmacenColumnar:
+    """Acceso de solo lectura a un almacén columnar construido con `construir_almacen`."""
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), encoding="utf-8") as f:
+            self.manifiesto = json.load(f)
+
+    @property
+    def columnas(self) -> list[str]:
+        return list(self.manifiesto["columnas"])
+
+    def columna(self, nombre: str) -> np.ndarray:
+        """
+        Devuelve una columna como arreglo con memoria mapeada (solo lectura, sin copiar).
+
+        Para columnas de texto u objetos se devuelven los códigos enteros (-1 = vacío); los
+        valores están en `categorias`.
+        """
+        info = self.manifiesto["columnas"][nombre]
+        return np.load(os.path.join(self.directorio, f"{info['archivo']}.npy"), mmap_mode="r")
+
+    def categorias(self, nombre: str) -> np.ndarray:
+        """Devuelve el diccionario de valores de una columna de texto u objetos."""
+        info = self.manifiesto["columnas"][nombre]
+        ruta = os.path.join(self.directorio, f"{info['archivo']}.categorias.npy")
+        if info["tipo"] == "objeto":
+            return np.load(ruta, allow_pickle=True) # Objetos de Python: no admiten memoria mapeada
+        return np.load(ruta, mmap_mode="r")
+
+    def cargar(self, columnas: list[str], decodificar_texto: bool = True) -> pd.DataFrame:
+        """
+        Carga solo las columnas pedidas.
+
+        Las columnas numéricas se entregan sin copiar (memoria mapeada compartida). Las de texto u
+        objetos se entregan como Categorical, o como sus códigos enteros si `decodificar_texto` es False.
+
+        Args:
+            columnas (list[str]): Columnas a cargar.
+            decodificar_texto (bool): Convertir las columnas de texto a Categorical.
+
+        Returns:
+            pd.DataFrame: DataFrame con las columnas pedidas.
+        """
+        faltantes = [col for col in columnas if col not in self.manifiesto["columnas"]]
+        if faltantes:
+            raise ValueError(f"Las columnas {faltantes} no existen en el almacén '{self.directorio}'.")
+
+        datos = {}
+        for col in columnas:
+            valores = self.columna(col)
+            if self.manifiesto["columnas"][col]["tipo"] in ("texto", "objeto") and decodificar_texto:
+                valores = pd.Categorical.from_codes(valores, categories=self.categorias(col))
+            datos[col] = valores
+        return pd.DataFrame(datos, copy=False)
+
+
+def obtener_almacen(ruta_excel: str, directorio_cache: str, mapeo_columnas: dict[str, str] = None) -> AlmacenColumnar:
+    """
+    Abre el almacén columnar de un maestro, construyéndolo si no existe o si el Excel cambió.
+
+    Args:
+        ruta_excel (str): Ruta del archivo Excel del maestro.
+        directorio_cache (str): Carpeta base de cachés (los almacenes quedan en `<directorio_cache>/almacen/`,
+                                uno por ruta absoluta del Excel).
+        mapeo_columnas (dict[str, str], optional): Renombre de columnas configurado para el maestro.
+
+    Returns:
+        AlmacenColumnar: Almacén listo para leer.
+    """
+    # Maestros con el mismo nombre en carpetas distintas no comparten ni se reemplazan el almacén
+    ruta_absoluta = os.path.abspath(ruta_excel)
+    nombre = os.path.splitext(os.path.basename(ruta_absoluta))[0]
+    huella_ruta = hashlib.sha256(ruta_absoluta.encode("utf-8")).hexdigest()[:16]
+    directorio = os.path.join(directorio_cache, "almacen", f"{nombre}_{huella_ruta}")
+    manifiesto = os.path.join(directorio, ARCHIVO_MANIFIESTO)
+
+    vigente = False
+    if os.path.exists(manifiesto):
+        with open(manifiesto, encoding="utf-8") as f:
+            datos = json.load(f)
+        vigente = datos.get("version") == VERSION_ALMACEN and datos["origen"] == _version_archivo(ruta_excel) and datos["mapeo_columnas"] == (mapeo_columnas or {})
+
+    if not vigente:
+        os.makedirs(os.path.dirname(directorio), exist_ok=True)
+        construir_almacen(ruta_excel, directorio, mapeo_columnas)
+    return AlmacenColumnar(directorio)
@@ -1,25 +1,14 @@
+import time
+_INICIO_SCRIPT = time.perf_counter() # Para medir el tiempo de render de la página
+
 import streamlit as st
-import pandas as pd
 import os
 import io
-from datetime import datetime
-import time # Importar para simular carga
-
-# Importar las funciones y clases del script modificado
-from Evaluacion_Comercial import (
-    Configuracion,
-    validar_archivos,
-    cargar_archivos,
-    preparar_datos,
-    convertir_ciudades,
-    procesar_cotizaciones,
-    calcular_costo_handling_final,
-    calcular_costo_ultimamilla_final,
-    preparar_dataframe_para_exportar,
-    generar_nombre_archivo,
-    COSTO_INHOUSE_FIJO,
-    COSTO_PRIMERA_MILLA_FIJO
-)
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+# pandas y Evaluacion_Comercial se importan en segundo plano (ver `iniciar_motor`), para que la
+# página se muestre sin esperar la carga del motor de cálculo ni de los maestros
 
 # --- CONFIGURACIÓN DE PÁGINA Y ESTILO STREAMLIT ---
 st.set_page_config(
@@ -32,157 +21,53 @@ st.set_page_config(
 # Rutas
 DATA_FOLDER = "data/"
 TEMPLATE_FILE = os.path.join(DATA_FOLDER, "Cotizar.xlsx") # Aseguramos el nombre correcto
+CONFIG_FILE = "config.toml"
+ESTILOS_FILE = "estilos.css"
+
+# Tiempo máximo esperado para mostrar la página (segundos); si se supera se registra una advertencia
+PRESUPUESTO_RENDER_S = 0.5
+
+logger = logging.getLogger(__name__)
+
+def _preparar_motor():
+    """Importa el motor de cálculo, crea la configuración y precarga los maestros."""
+    import Evaluacion_Comercial as motor
+
+    config = motor.Configuracion(base_path=DATA_FOLDER, archivo_config=CONFIG_FILE if os.path.exists(CONFIG_FILE) else None)
+    try:
+        motor.cargar_maestros(config)
+        motor.obtener_indice_agencias(config)
+    except Exception as e:
+        # Los archivos faltantes o inválidos se informan al procesar, con `validar_archivos`
+        logger.warning("No se pudieron precargar los maestros: %s", e)
+    return motor, config
+
+# El motor se prepara una sola vez por servidor, en un hilo aparte
+@st.cache_resource
+def iniciar_motor() -> Future:
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="precarga").submit(_preparar_motor)
+
+motor_futuro = iniciar_motor()
+
+# Caché de resultados compartida entre sesiones; se crea una por directorio y límites, para que un cambio en la configuración se aplique
+@st.cache_resource
+def obtener_cache_resultados(directorio_cache: str, cache_max_mb: int, cache_max_memoria: int):
+    from cache_resultados import CacheResultados
+    return CacheResultados(directorio_cache, cache_max_mb, cache_max_memoria)
 
-# Instancia de configuración con la ruta de datos
-config = Configuracion(base_path=DATA_FOLDER)
+# Hilos para leer los archivos subidos sin bloquear la preparación de los datos
+@st.cache_resource
+def obtener_ejecutor_lectura() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="lectura")
 
 # --- ESTILO CSS PERSONALIZADO (MÁS PROFUNDO) ---
-st.markdown(
-    """
-    <style>
-    /* Asegurarse que el fondo principal sea blanco */
-    .stApp {
-        background-color: #1A3B15; /* Un gris muy claro para un contraste suave */
-    }
-    .main {
-        background-color: #FFFFFF; /* Contenido principal blanco */
-        border-radius: 15px; /* Bordes más redondeados para el área principal */
-        padding: 30px; /* Más padding para el contenido */
-        box-shadow: 0 4px 15px rgba(0, 0, 0, 0.08); /* Sombra más pronunciada */
-    }
-
-    /* Estilo para los botones */
-    .stButton>button {
-        background-color: #FF6600; /* Naranja Starken */
-        color: white;
-        border-radius: 10px; /* Bordes muy redondeados */
-        border: none;
-        padding: 15px 30px; /* Más padding para botones grandes */
-        font-size: 1.1em; /* Texto un poco más grande */
-        font-weight: bold;
-        cursor: pointer;
-        transition: all 0.3s ease;
-        box-shadow: 3px 3px 10px rgba(0,0,0,0.2); /* Sombra más definida */
-        margin-top: 15px; /* Espacio superior */
-    }
-    .stButton>button:hover {
-        background-color: #E65C00; /* Naranja más oscuro al pasar el ratón */
-        transform: translateY(-4px); /* Efecto 3D al pasar el ratón */
-        box-shadow: 5px 5px 15px rgba(0,0,0,0.3);
-    }
-
-    /* Estilo para el cargador de archivos */
-    .stFileUploader>div>div>button {
-        background-color: #4CAF50; /* Verde para el cargador de archivos */
-        color: white; /* Texto blanco en el botón de subir */
-        border-radius: 10px;
-        border: none;
-        padding: 12px 25px;
-        font-size: 1em;
-        cursor: pointer;
-        transition: all 0.3s ease;
-        box-shadow: 2px 2px 8px rgba(0,0,0,0.15);
-    }
-    .stFileUploader>div>div>button:hover {
-        background-color: #45a049;
-        transform: translateY(-2px);
-    }
-
-    /* Título principal de la aplicación */
-    h1 {
-        color: #000000 !important; /* NEGRO para el título principal, con !important */
-        text-align: center;
-        font-size: 3.8em; /* Título aún más grande */
-        margin-bottom: 0.3em;
-        text-shadow: 2px 2px 5px rgba(0,0,0,0.1);
-        font-family: 'Arial Black', Gadget, sans-serif; /* Fuente más impactante */
-    }
-    /* Asegurarse que el texto genérico de párrafos sea oscuro */
-    .stMarkdown p { 
-        text-align: center;
-        font-size: 1.3em;
-        color: #000000; /* Gris oscuro para el texto de descripción */
-        margin-bottom: 2em;
-    }
-
-    /* Subtítulos de sección (como los de "Subir archivo", "Procesar", "Descargar") */
-    h3 {
-        color: #000000 !important; /* NEGRO para los subtítulos de sección, con !important */
-        font-size: 2.2em; /* Título de sección más grande */
-        margin-bottom: 1em;
-        font-weight: bold;
-        text-align: center; /* Centrar títulos de sección */
-        padding-bottom: 10px;
-        border-bottom: 2px solid #EEEEEE;
-    }
-
-    /* Eliminar el logo */
-    .logo-top-right {
-        display: none !important;
-    }
-
-    /* Contenedores de sección con diseño de tarjeta */
-    .st-emotion-cache-nahz7x { /* Esta clase es el contenedor principal de Streamlit para el contenido */
-        border-radius: 15px !important;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.1); /* Sombra más fuerte para los "cards" */
-        padding: 30px !important;
-        margin-bottom: 30px !important; /* Espacio entre secciones */
-        background-color: #FFFFFF; /* Fondo blanco para las tarjetas */
-    }
-    /* Estilo para los mensajes de alerta, éxito, error (asegurando contraste) */
-    .stAlert { 
-        border-radius: 10px;
-        font-size: 1.1em;
-        padding: 1rem 1.2rem;
-        margin-bottom: 1rem;
-    }
-    .stSuccess {
-        color: #006400 !important; /* Verde oscuro para texto de éxito */
-        background-color: #D4EDDA !important; /* Fondo verde claro para éxito */
-        border: 1px solid #C3E6CB !important;
-    }
-    .stInfo {
-        color: #004085 !important; /* Azul oscuro para texto de información */
-        background-color: #CCE5FF !important; /* Fondo azul claro para info */
-        border: 1px solid #B8DAFF !important;
-    }
-    .stError {
-        color: #721C24 !important; /* Rojo oscuro para texto de error */
-        background-color: #F8D7DA !important; /* Fondo rojo claro para error */
-        border: 1px solid #F5C6CB !important;
-    }
-    .stWarning {
-        color: #856404 !important; /* Amarillo oscuro para texto de advertencia */
-        background-color: #FFF3CD !important; /* Fondo amarillo claro para advertencia */
-        border: 1px solid #FFEEDB !important;
-    }
-
-    .stTextInput>div>div>input { /* Estilo para el campo de texto de empresa */
-        border-radius: 10px;
-        border: 1px solid #CCCCCC;
-        padding: 12px;
-        font-size: 1.1em;
-    }
-    /* Asegurar que el texto dentro de los status messages también sea legible */
-    .st-emotion-cache-1f819w0 { /* Clases genéricas de los mensajes de estado */
-        padding: 1rem 1.2rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    /* Asegurar color de texto para st.write normal */
-    div.stMarkdown {
-        color: #000000; /* Color oscuro para el texto normal */
-    }
-    /* También apuntar a p directamente dentro del st.markdown para textos genéricos */
-    .stMarkdown p {
-        color: #000000;
-    }
-
-
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+# Los estilos viven en `estilos.css`; se leen una sola vez por servidor
+@st.cache_resource
+def leer_estilos() -> str:
+    with open(ESTILOS_FILE, encoding="utf-8") as f:
+        return f.read()
+
+st.markdown(f"<style>{leer_estilos()}</style>", unsafe_allow_html=True)
 
 # --- CABECERA SIN LOGO Y TÍTULO ---
 st.title("Cotizador Comercial Starken 📦")
@@ -230,9 +115,18 @@ with st.container(border=True):
             progress_container = st.empty() 
             
             try:
+                import pandas as pd
+                try:
+                    motor, config = motor_futuro.result() # Normalmente ya está listo: se precarga al iniciar el servidor
+                except Exception:
+                    # No se conserva un motor fallido (por ejemplo, por un config.toml inválido): el
+                    # próximo intento lo vuelve a preparar, ya con el archivo corregido
+                    iniciar_motor.clear()
+                    raise
+                config.recargar()
+
                 with progress_container.status("🔍 Validando archivos auxiliares del sistema...", expanded=True) as status_validar:
-                    time.sleep(0.5)
-                    archivos_ok, archivos_faltantes = validar_archivos(config)
+                    archivos_ok, archivos_faltantes = motor.validar_archivos(config)
                     if not archivos_ok:
                         status_validar.update(label="❌ Validación fallida.", state="error", expanded=True)
                         st.error(f"🚨 **Error crítico:** Faltan archivos maestros en la carpeta `{DATA_FOLDER}`. Asegúrate de tener todos:")
@@ -241,166 +135,102 @@ with st.container(border=True):
                         st.stop()
                     status_validar.update(label="✅ Archivos auxiliares validados.", state="complete", expanded=False)
                 
-                with progress_container.status("📖 Leyendo archivo de cotización subido...", expanded=True) as status_lectura:
-                    time.sleep(0.5)
-                    cotizar_df_input = pd.read_excel(uploaded_file)
-                    if cotizar_df_input.empty:
-                        status_lectura.update(label="❌ Archivo vacío.", state="error", expanded=True)
-                        st.error("🚨 **Error:** El archivo Excel subido está vacío o no contiene datos válidos.")
-                        st.stop()
-                    status_lectura.update(label="✅ Archivo de cotización leído.", state="complete", expanded=False)
-
-                with progress_container.status("⚙️ Preparando y unificando datos para el cálculo...", expanded=True) as status_preparacion:
-                    time.sleep(0.5)
-                    archivos = cargar_archivos(config, cotizar_df_input)
-                    archivos = preparar_datos(archivos, config)
-                    archivos, origen_problemas, destino_problemas = convertir_ciudades(archivos, config)
-
-                    if origen_problemas:
-                        st.warning(f"⚠️ **Alerta:** Algunas ciudades de ORIGEN no fueron mapeadas correctamente (mostrando las primeras 10): {', '.join(origen_problemas)}")
-                    if destino_problemas:
-                        st.warning(f"⚠️ **Alerta:** Algunas ciudades de DESTINO no fueron mapeadas correctamente (mostrando las primeras 10): {', '.join(destino_problemas)}")
-                    status_preparacion.update(label="✅ Datos preparados y ubicaciones mapeadas.", state="complete", expanded=False)
-
-                with progress_container.status("🔄 Calculando cotizaciones y analizando rentabilidad... (esto puede tardar unos segundos)", expanded=True) as status_calculo:
-                    time.sleep(2) # Simula procesamiento pesado
-                    resultados_df = procesar_cotizaciones(archivos)
-                    resultados_df = calcular_costo_handling_final(resultados_df, archivos['ma_costo_handling'])
-                    resultados_df = calcular_costo_ultimamilla_final(resultados_df, archivos['ma_costo_ultimamilla'])
-                    status_calculo.update(label="✅ Cotizaciones calculadas y costos finales aplicados.", state="complete", expanded=False)
-                
-                with progress_container.status("📊 Organizando resultados para el informe final...", expanded=True) as status_exportacion:
-                    time.sleep(0.5)
-                    final_df_to_export, resumen_valores = preparar_dataframe_para_exportar(resultados_df.copy(), nombre_empresa_input)
-                    status_exportacion.update(label="✅ Informe listo para descarga.", state="complete", expanded=False)
+                # Si el mismo archivo ya se procesó con los mismos maestros y configuración, se reutiliza el resultado
+                resultados_cache = obtener_cache_resultados(config.directorio_cache, config.cache_max_mb, config.cache_max_memoria)
+                clave_resultado = resultados_cache.clave(uploaded_file.getvalue(), config)
+                en_cache = resultados_cache.obtener(clave_resultado, nombre_empresa_input)
+
+                if en_cache is not None:
+                    final_df_to_export, resumen_valores, advertencias, cubos, processed_data = en_cache
+                    st.info("♻️ Este archivo ya fue procesado: se reutilizan los resultados calculados.")
+                else:
+                    advertencias = []
+                    with progress_container.status("📖 Leyendo archivo de cotización subido...", expanded=True) as status_lectura:
+                        from ingesta_cotizacion import leer_cotizacion
+
+                        # El avance lo escribe el hilo de lectura; la barra solo se actualiza desde este hilo
+                        avance = {"fraccion": 0.0, "mensaje": "Iniciando lectura..."}
+                        barra_lectura = st.progress(0.0, text=avance["mensaje"])
+                        lectura = obtener_ejecutor_lectura().submit(
+                            leer_cotizacion, io.BytesIO(uploaded_file.getvalue()), config.n_procesos,
+                            lambda fraccion, mensaje: avance.update(fraccion=fraccion, mensaje=mensaje)
+                        )
+
+                        # Mientras se lee el archivo, se dejan listos los maestros y el índice de agencias
+                        motor.cargar_maestros(config)
+                        motor.obtener_indice_agencias(config)
+
+                        while not lectura.done():
+                            barra_lectura.progress(avance["fraccion"], text=avance["mensaje"])
+                            wait([lectura], timeout=0.1)
+                        cotizar_df_input = lectura.result()
+                        barra_lectura.empty()
+                        if cotizar_df_input.empty:
+                            status_lectura.update(label="❌ Archivo vacío.", state="error", expanded=True)
+                            st.error("🚨 **Error:** El archivo Excel subido está vacío o no contiene datos válidos.")
+                            st.stop()
+                        status_lectura.update(label="✅ Archivo de cotización leído.", state="complete", expanded=False)
+
+                    with progress_container.status("⚙️ Preparando y unificando datos para el cálculo...", expanded=True) as status_preparacion:
+                        archivos = motor.cargar_archivos(config, cotizar_df_input)
+
+                        # Validar todos los archivos antes de calcular, para fallar rápido con el reporte completo
+                        datos_ok, reporte_validacion = motor.validar_datos(archivos, config)
+                        if not datos_ok:
+                            status_preparacion.update(label="❌ Validación de datos fallida.", state="error", expanded=True)
+                            errores = pd.DataFrame([e for e in reporte_validacion if e['nivel'] == 'error'])
+                            st.error("🚨 **Error:** Se encontraron problemas en los datos. Corrígelos y vuelve a procesar:")
+                            st.dataframe(errores.drop(columns=['filas']), hide_index=True)
+                            st.download_button(
+                                label="⬇️ Descargar reporte de validación (JSON)",
+                                data=errores.to_json(orient='records', force_ascii=False),
+                                file_name="reporte_validacion.json",
+                                mime="application/json"
+                            )
+                            st.stop()
+
+                        archivos = motor.preparar_datos(archivos, config)
+                        archivos, origen_problemas, destino_problemas = motor.convertir_ciudades(archivos, config)
+
+                        if origen_problemas:
+                            advertencias.append(f"⚠️ **Alerta:** Algunas ciudades de ORIGEN no fueron mapeadas correctamente (mostrando las primeras 10): {', '.join(map(str, origen_problemas))}")
+                        if destino_problemas:
+                            advertencias.append(f"⚠️ **Alerta:** Algunas ciudades de DESTINO no fueron mapeadas correctamente (mostrando las primeras 10): {', '.join(map(str, destino_problemas))}")
+
+                        archivos, origen_sin_agencia, destino_sin_agencia = motor.asignar_agencias(archivos, motor.obtener_indice_agencias(config))
+                        if origen_sin_agencia:
+                            advertencias.append(f"⚠️ **Alerta:** Algunas comunas de ORIGEN no tienen agencia operativa (mostrando las primeras 10): {', '.join(map(str, origen_sin_agencia))}")
+                        if destino_sin_agencia:
+                            advertencias.append(f"⚠️ **Alerta:** Algunas comunas de DESTINO no tienen cobertura directa ni indirecta (mostrando las primeras 10): {', '.join(map(str, destino_sin_agencia))}")
+                        status_preparacion.update(label="✅ Datos preparados y ubicaciones mapeadas.", state="complete", expanded=False)
+
+                    with progress_container.status("🔄 Calculando cotizaciones y analizando rentabilidad... (esto puede tardar unos segundos)", expanded=True) as status_calculo:
+                        resultados_df = motor.calcular_cotizacion(archivos, config)
+                        status_calculo.update(label="✅ Cotizaciones calculadas y costos finales aplicados.", state="complete", expanded=False)
                 
+                    with progress_container.status("📊 Organizando resultados para el informe final...", expanded=True) as status_exportacion:
+                        final_df_to_export, resumen_valores = motor.preparar_dataframe_para_exportar(resultados_df.copy(), nombre_empresa_input)
+
+                        # Generar el archivo Excel en memoria; no depende de la empresa, así que se guarda tal cual en la caché
+                        output = io.BytesIO()
+                        cubos = motor.calcular_cubos(motor.cubo_base_parcial(final_df_to_export))
+                        motor.escribir_informe_excel(final_df_to_export, resumen_valores, output, cubos)
+                        processed_data = output.getvalue()
+                        status_exportacion.update(label="✅ Informe listo para descarga.", state="complete", expanded=False)
+
+                    resultados_cache.guardar(clave_resultado, final_df_to_export, resumen_valores, advertencias, cubos, processed_data)
+
+                for advertencia in advertencias:
+                    st.warning(advertencia)
+
                 # Ocultar el último mensaje de progreso antes de mostrar el botón de descarga
                 progress_container.empty()
                 st.success("🎉 ¡Proceso completado exitosamente! Tu informe está listo para descargar.")
 
-                # Generar el archivo Excel en memoria
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    final_df_to_export.to_excel(writer, sheet_name='Evaluacion Comercial', index=False)
-
-                    # Hoja de resumen (el código de formatos y llenado de resumen es el mismo que antes)
-                    worksheet_resumen = writer.book.add_worksheet('Resumen Cotizacion')
-                    workbook = writer.book
-
-                    # === DEFINICIÓN DE FORMATOS ===
-                    header_merge_format = workbook.add_format({
-                        'bold': True, 'align': 'center', 'valign': 'vcenter',
-                        'bg_color': '#D9D9D9', 'border': 1
-                    })
-                    label_format = workbook.add_format({'align': 'left', 'valign': 'vcenter'})
-                    value_format = workbook.add_format({'align': 'right', 'valign': 'vcenter'})
-                    currency_value_format = workbook.add_format({
-                        'align': 'right', 'valign': 'vcenter', 'num_format': '$#,##0'
-                    })
-                    percent_value_format = workbook.add_format({
-                        'align': 'right', 'valign': 'vcenter', 'num_format': '0%'
-                    })
-                    total_label_format = workbook.add_format({
-                        'bold': True, 'align': 'left', 'valign': 'vcenter', 'top': 1, 'bottom': 1
-                    })
-                    total_currency_format = workbook.add_format({
-                        'bold': True, 'align': 'right', 'valign': 'vcenter',
-                        'top': 1, 'bottom': 1, 'num_format': '$#,##0'
-                    })
-                    margin_format = workbook.add_format({
-                        'bold': True, 'align': 'right', 'valign': 'vcenter',
-                        'top': 1, 'bottom': 1, 'num_format': '0.0%'
-                    })
-                    sub_header_format = workbook.add_format({
-                        'bold': True, 'align': 'right', 'valign': 'vcenter',
-                        'bg_color': '#D9D9D9', 'top': 1, 'bottom': 1, 'left': 1, 'right': 1
-                    })
-                    ingreso_label_format = workbook.add_format({
-                        'bold': True, 'align': 'left', 'valign': 'vcenter', 'top': 1
-                    })
-                    ingreso_value_format = workbook.add_format({
-                        'bold': True, 'align': 'right', 'valign': 'vcenter', 'top': 1, 'num_format': '$#,##0'
-                    })
-
-                    # Ancho de columnas para la hoja de resumen
-                    worksheet_resumen.set_column('A:A', 25)
-                    worksheet_resumen.set_column('B:B', 15)
-                    row_offset = 0
-
-                    # === SECCIÓN COTIZACIÓN ===
-                    worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Cotización', header_merge_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Envios Mensuales', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_envios'], value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Peso Promedio', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['peso_promedio'], value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Recorrido Promedio (km)', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['recorrido_promedio'], value_format)
-                    row_offset += 2 # Espacio
-
-                    # === SECCIÓN INGRESOS ===
-                    worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Ingresos', header_merge_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Valor Base (Tarifa Cliente)', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_valor_tarifa_cliente'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Cargo Adicional', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_cargo_adicional'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Valor Handling', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_handling'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Valor Última Milla', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_ultimamilla'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Ingreso Bruto Mensual', ingreso_label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['ingreso_bruto_mensual'], ingreso_value_format)
-                    row_offset += 2 # Espacio
-
-                    # === SECCIÓN COSTOS VARIABLES ===
-                    worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Costos Variables (Mensual)', header_merge_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Costo Troncal', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_troncal'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Costo Primera Milla', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_primera_milla'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Costo Última Milla', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_ultimamilla_costo'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Costo Handling', label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['total_costo_handling_costo'], currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Costo Total Variable', total_label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['costo_total_variable'], total_currency_format)
-                    row_offset += 2 # Espacio
-
-                    # === SECCIÓN COSTOS FIJOS ===
-                    worksheet_resumen.merge_range(row_offset, 0, row_offset, 1, 'Costos Fijos (Mensual)', header_merge_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'InHouse', label_format)
-                    worksheet_resumen.write(row_offset, 1, COSTO_INHOUSE_FIJO, currency_value_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'Costo Total Fijo', total_label_format)
-                    worksheet_resumen.write(row_offset, 1, COSTO_INHOUSE_FIJO, total_currency_format)
-                    row_offset += 2 # Espacio
-
-                    # === SECCIÓN RESUMEN FINAL ===
-                    worksheet_resumen.write(row_offset, 0, 'UTILIDAD', total_label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['utilidad_mensual'], total_currency_format)
-                    row_offset += 1
-                    worksheet_resumen.write(row_offset, 0, 'MARGEN (%)', total_label_format)
-                    worksheet_resumen.write(row_offset, 1, resumen_valores['margen_porcentaje'], margin_format)
-
-                processed_data = output.getvalue()
-                
                 st.download_button(
                     label="⬇️ Descargar Informe de Evaluación Comercial",
                     data=processed_data,
-                    file_name=generar_nombre_archivo(nombre_empresa_input),
+                    file_name=motor.generar_nombre_archivo(nombre_empresa_input),
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     help="Haz clic para descargar el informe de evaluación comercial procesado en formato Excel."
                 )
@@ -434,4 +264,9 @@ with st.container(border=True):
         st.error(f"❌ **Error al preparar la descarga de la plantilla:** {e}")
     st.markdown("---") # Separador interno
 
-st.markdown("<br><br><p style='text-align: center; color: #AAAAAA; font-size: 0.9em;'>© 2025 Cotizador Comercial. Todos los derechos reservados.</p>", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown("<br><br><p style='text-align: center; color: #AAAAAA; font-size: 0.9em;'>© 2025 Cotizador Comercial. Todos los derechos reservados.</p>", unsafe_allow_html=True)
+
+# --- MEDICIÓN DEL TIEMPO DE RENDER ---
+duracion_render = time.perf_counter() - _INICIO_SCRIPT
+if not process_button and duracion_render > PRESUPUESTO_RENDER_S:
+    logger.warning("La página tardó %.2f s en mostrarse (presupuesto: %.2f s).", duracion_render, PRESUPUESTO_RENDER_S)
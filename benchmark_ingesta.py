@@ -0,0 +1,76 @@
+"""
+Compara la lectura de archivos de cotización con `pd.read_excel` y con `ingesta_cotizacion`.
+
+Genera (si no existe) un libro con el formato de la plantilla y N filas, lo lee con cada
+método, verifica que los DataFrames sean iguales y muestra los tiempos.
+
+Uso:
+    python benchmark_ingesta.py [--filas 500000] [--procesos 4] [--archivo bench_cotizar.xlsx]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingesta_cotizacion import leer_cotizacion
+
+COMUNAS = ["SANTIAGO", "PROVIDENCIA", "LAS CONDES", "MAIPU", "VALPARAISO", "VIÑA DEL MAR", "CONCEPCION",
+           "TEMUCO", "ANTOFAGASTA", "LA SERENA", "PUERTO MONTT", "RANCAGUA", "TALCA", "ARICA", "IQUIQUE"]
+
+
+def generar_libro(ruta: str, filas: int, semilla: int = 0) -> None:
+    """Escribe un archivo de cotización sintético con las columnas de la plantilla y una de códigos mixtos."""
+    azar = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        "ORIGEN": azar.choice(COMUNAS, filas),
+        "DESTINO": azar.choice(COMUNAS, filas),
+        "TARIFARIO": azar.choice(["A", "B", "C"], filas),
+        "PESO": np.round(azar.uniform(0.1, 50, filas), 2),
+        "TIPO ENTREGA": azar.choice(["DOMICILIO", "AGENCIA"], filas),
+        "TIPO SERVICIO": azar.choice(["NORMAL", "EXPRESS"], filas),
+        # Códigos que parecen números en la primera parte del libro y no en el resto: el tipo de
+        # la columna solo queda bien si se infiere sobre todas las filas juntas
+        "CODIGO CLIENTE": [f"{i % 1000:03d}" if i < filas * 0.6 else f"C{i % 1000}" for i in range(filas)]
+    })
+    df.to_excel(ruta, index=False, engine="xlsxwriter")
+
+
+def medir(nombre: str, funcion) -> tuple[str, float, pd.DataFrame]:
+    inicio = time.perf_counter()
+    df = funcion()
+    return nombre, time.perf_counter() - inicio, df
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de lectura de archivos de cotización.")
+    parser.add_argument("--filas", type=int, default=500_000, help="Filas del libro generado (por defecto: 500000).")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="Procesos para la lectura en paralelo.")
+    parser.add_argument("--archivo", default="bench_cotizar.xlsx", help="Libro a leer; se genera si no existe.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.archivo):
+        print(f"Generando {args.archivo} con {args.filas:,} filas...")
+        generar_libro(args.archivo, args.filas)
+
+    mediciones = [
+        medir("pd.read_excel", lambda: pd.read_excel(args.archivo)),
+        medir("leer_cotizacion (1 proceso)", lambda: leer_cotizacion(args.archivo))
+    ]
+    if args.procesos > 1:
+        mediciones.append(medir(f"leer_cotizacion ({args.procesos} procesos)",
+                                lambda: leer_cotizacion(args.archivo, n_procesos=args.procesos)))
+
+    _, base, referencia = mediciones[0]
+    print(f"\n{'Método':<32}{'Segundos':>10}{'Aceleración':>13}")
+    for nombre, segundos, df in mediciones:
+        pd.testing.assert_frame_equal(referencia, df)
+        print(f"{nombre:<32}{segundos:>10.2f}{base / segundos:>12.1f}x")
+    print(f"\n{len(referencia):,} filas; resultados idénticos a pd.read_excel.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
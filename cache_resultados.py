@@ -0,0 +1,165 @@
+"""
+Caché de resultados de cotización, direccionada por contenido.
+
+La clave combina el hash del archivo subido, la versión de los maestros, la configuración
+que afecta el cálculo y la versión del código del motor. Se guarda el DataFrame final, el resumen
+sin los datos de la empresa, los cubos y el libro Excel ya escrito, que no depende de la empresa
+(solo el nombre del archivo la incluye): volver a subir el mismo archivo, aunque sea con otro
+nombre de empresa, no recalcula ni vuelve a escribir el informe.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import almacen_columnar
+import Evaluacion_Comercial as motor
+import ingesta_cotizacion
+
+# Campos del resumen que dependen de la empresa o del momento, y no se guardan en la caché
+CAMPOS_RESUMEN_POR_SOLICITUD = ["nombre_empresa", "fecha_generacion"]
+
+# Módulos cuyo código determina el resultado de un archivo subido
+MODULOS_CALCULO = [motor, almacen_columnar, ingesta_cotizacion]
+
+
+def version_codigo() -> str:
+    """
+    Calcula un hash del código de los módulos del cálculo, de este módulo y de las versiones de pandas y NumPy.
+
+    Los resultados guardados en disco sobreviven a los reinicios del servidor; al incluir esta
+    versión en la clave, una actualización del motor o del formato de las entradas no reutiliza
+    resultados anteriores.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    h = hashlib.sha256(f"pandas {pd.__version__} numpy {np.__version__}".encode("utf-8"))
+    for ruta in [modulo.__file__ for modulo in MODULOS_CALCULO] + [__file__]:
+        with open(ruta, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+VERSION_CODIGO = version_codigo()
+
+
+class CacheResultados:
+    """Caché LRU de resultados en memoria y en disco."""
+    def __init__(self, directorio: str, max_mb: int = 500, max_memoria: int = 8):
+        self.directorio = directorio
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_memoria = max_memoria
+        self._memoria: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock() # La caché se comparte entre sesiones de Streamlit
+        os.makedirs(directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(contenido: bytes, config: motor.Configuracion) -> str:
+        """
+        Calcula la clave de un resultado.
+
+        Args:
+            contenido (bytes): Bytes del archivo de cotización subido.
+            config (Configuracion): Configuración vigente.
+
+        Returns:
+            str: Clave hexadecimal.
+        """
+        h = hashlib.sha256(contenido)
+        h.update(repr(motor.version_maestros(list(config.rutas.values()))).encode("utf-8"))
+        h.update(config.huella().encode("utf-8"))
+        h.update(VERSION_CODIGO.encode("utf-8"))
+        return h.hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.pkl")
+
+    def obtener(self, clave: str, nombre_empresa: str):
+        """
+        Busca un resultado en la caché.
+
+        Args:
+            clave (str): Clave calculada con `clave`.
+            nombre_empresa (str): Nombre de la empresa para completar el resumen.
+
+        Returns:
+            tuple[pd.DataFrame, dict, list[str], dict[str, pd.DataFrame], bytes] | None:
+                DataFrame final, resumen, advertencias, cubos y bytes del informe Excel,
+                o None si no está en caché.
+        """
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+            else:
+                ruta = self._ruta(clave)
+                if not os.path.exists(ruta):
+                    return None
+                try:
+                    with open(ruta, "rb") as f:
+                        entrada = pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    return None # Entrada dañada o eliminada por otro proceso: se recalcula
+                os.utime(ruta) # Marca el uso para el LRU en disco
+                self._guardar_en_memoria(clave, entrada)
+
+        df_final, resumen_base, advertencias, cubos, informe = entrada
+        resumen_valores = dict(resumen_base, nombre_empresa=nombre_empresa,
+                               fecha_generacion=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        return df_final, resumen_valores, list(advertencias), cubos, informe
+
+    def guardar(self, clave: str, df_final: pd.DataFrame, resumen_valores: dict, advertencias: list[str],
+                cubos: dict[str, pd.DataFrame], informe: bytes) -> None:
+        """
+        Guarda un resultado en memoria y en disco, eliminando los menos usados si se supera el límite.
+
+        Args:
+            clave (str): Clave calculada con `clave`.
+            df_final (pd.DataFrame): DataFrame final de la cotización.
+            resumen_valores (dict): Resumen de la cotización.
+            advertencias (list[str]): Advertencias generadas durante el cálculo.
+            cubos (dict[str, pd.DataFrame]): Cubos de rentabilidad de `calcular_cubos`.
+            informe (bytes): Libro Excel escrito con `escribir_informe_excel`.
+        """
+        resumen_base = {k: v for k, v in resumen_valores.items() if k not in CAMPOS_RESUMEN_POR_SOLICITUD}
+        entrada = (df_final, resumen_base, list(advertencias), cubos, informe)
+
+        with self._lock:
+            self._guardar_en_memoria(clave, entrada)
+
+            # Escritura atómica: otro proceso nunca ve un archivo a medio escribir
+            ruta = self._ruta(clave)
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with open(temporal, "wb") as f:
+                pickle.dump(entrada, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)
+            self._limpiar_disco()
+
+    def _guardar_en_memoria(self, clave: str, entrada: tuple) -> None:
+        self._memoria[clave] = entrada
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def _limpiar_disco(self) -> None:
+        """Elimina los archivos usados hace más tiempo hasta quedar bajo el tamaño máximo."""
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.directorio, nombre))
+                archivos.append((stat.st_mtime_ns, stat.st_size, nombre))
+
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, nombre in sorted(archivos):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directorio, nombre))
+            except FileNotFoundError:
+                pass
+            total -= tamano
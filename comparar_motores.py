@@ -0,0 +1,486 @@
+"""
+Comparación diferencial de motores de cálculo contra el flujo de referencia.
+
+Ejecuta el flujo de referencia (en serie, un solo bloque) y uno o más motores candidatos
+sobre la plantilla `data/Cotizar.xlsx` y sobre cotizaciones generadas de distintos tamaños.
+Compara cada columna de `COLUMNAS_RESULTADO_FINAL` y cada valor de `resumen_valores` con
+tolerancia, e informa las diferencias por columna y los tiempos de cada motor.
+
+Un motor es una función `(config, cotizar_df, nombre_empresa) -> (df_final, resumen_valores)`
+y se indica como `modulo:funcion`. Sin candidatos se comparan los modos por bloques y en
+paralelo del motor actual.
+
+El flujo de referencia usa las mismas funciones del motor que los candidatos, por lo que un
+cambio en ellas cambia también la referencia. Para comparar contra resultados fijos, se guardan
+una vez las entradas y salidas de referencia (Parquet, resumen en JSON y un manifiesto con la
+semilla y los tamaños) con `--guardar-referencia`, y después se compara contra ellas con
+`--referencia`, sin volver a ejecutar el flujo de referencia.
+
+Uso:
+    python comparar_motores.py [--candidato modulo:funcion ...] [--tamanos 100 1000 10000]
+                               [--datos data/] [--maestros-sinteticos carpeta/] [--reporte reporte.json]
+    python comparar_motores.py --guardar-referencia referencia/ [--tamanos ...] [--semilla 0]
+    python comparar_motores.py --referencia referencia/ [--candidato modulo:funcion ...]
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import Evaluacion_Comercial as motor
+
+Motor = Callable[[motor.Configuracion, pd.DataFrame, str], tuple[pd.DataFrame, dict]]
+
+# Campos del resumen que dependen del momento de la ejecución y no se comparan
+CAMPOS_RESUMEN_IGNORADOS = ["fecha_generacion"]
+
+# Filas con diferencias que se muestran como ejemplo por columna
+MAX_EJEMPLOS = 5
+
+ARCHIVO_MANIFIESTO_REFERENCIA = "manifiesto.json"
+
+NOMBRE_EMPRESA = "Comparacion"
+
+
+# --- Motores ---
+
+def motor_referencia(config: motor.Configuracion, cotizar_df: pd.DataFrame, nombre_empresa: str) -> tuple[pd.DataFrame, dict]:
+    """Flujo de referencia: todas las etapas en serie y en un solo bloque."""
+    archivos = motor.cargar_archivos(config, cotizar_df)
+    datos_ok, reporte = motor.validar_datos(archivos, config)
+    if not datos_ok:
+        errores = [e for e in reporte if e['nivel'] == 'error']
+        raise ValueError(f"Se encontraron {len(errores)} problemas en los datos.")
+    archivos = motor.preparar_datos(archivos, config)
+    archivos, _, _ = motor.convertir_ciudades(archivos, config)
+    archivos, _, _ = motor.asignar_agencias(archivos, motor.obtener_indice_agencias(config))
+    resultados_df = motor.calcular_cotizacion(archivos, config, tamano_bloque=0, n_procesos=1)
+    return motor.preparar_dataframe_para_exportar(resultados_df, nombre_empresa)
+
+def motor_por_bloques(config: motor.Configuracion, cotizar_df: pd.DataFrame, nombre_empresa: str) -> tuple[pd.DataFrame, dict]:
+    """Motor actual procesando bloques de 1.000 envíos en serie."""
+    tamano_bloque, config.tamano_bloque = config.tamano_bloque, 1000
+    try:
+        return motor.evaluar_cotizacion(config, cotizar_df, nombre_empresa, n_procesos=1)[:2]
+    finally:
+        config.tamano_bloque = tamano_bloque
+
+def motor_paralelo(config: motor.Configuracion, cotizar_df: pd.DataFrame, nombre_empresa: str) -> tuple[pd.DataFrame, dict]:
+    """Motor actual procesando bloques de 1.000 envíos en 2 procesos."""
+    tamano_bloque, config.tamano_bloque = config.tamano_bloque, 1000
+    try:
+        return motor.evaluar_cotizacion(config, cotizar_df, nombre_empresa, n_procesos=2)[:2]
+    finally:
+        config.tamano_bloque = tamano_bloque
+
+CANDIDATOS_POR_DEFECTO = {"bloques": motor_por_bloques, "paralelo": motor_paralelo}
+
+def cargar_motor(ruta: str) -> Motor:
+    """
+    Importa un motor candidato.
+
+    Args:
+        ruta (str): Función en formato `modulo:funcion` (por ejemplo, `motor_rapido:evaluar`).
+
+    Returns:
+        Motor: Función del motor.
+    """
+    if ":" not in ruta:
+        raise ValueError(f"El candidato '{ruta}' debe tener el formato 'modulo:funcion'.")
+    modulo, funcion = ruta.split(":", 1)
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+# --- Entradas ---
+
+def generar_cotizacion(maestros: dict[str, pd.DataFrame], filas: int, semilla: int = 0) -> pd.DataFrame:
+    """
+    Genera una cotización con valores tomados de los maestros.
+
+    Incluye comunas con mayúsculas y espacios distintos, algunas comunas inexistentes y pesos
+    exactamente en los límites de los tramos, para ejercitar la normalización y los bordes.
+
+    Args:
+        maestros (dict[str, pd.DataFrame]): Maestros de `cargar_maestros`.
+        filas (int): Cantidad de envíos.
+        semilla (int): Semilla del generador aleatorio.
+
+    Returns:
+        pd.DataFrame: Cotización con las columnas de `COLUMNAS_COTIZACION_ENTRADA`.
+    """
+    azar = np.random.default_rng(semilla)
+    comunas = maestros["ma_ciudad"]["COMUNA"].dropna().astype(str).unique()
+    variantes = np.concatenate([comunas, [c.lower() for c in comunas], [f" {c} " for c in comunas], ["COMUNA INEXISTENTE"]])
+    tramos = maestros["ma_tarifa_peso"]["PESO_KG"].dropna().to_numpy(dtype=float)
+    tramos = tramos[(tramos > motor.PESO_MINIMO_KG) & (tramos <= motor.PESO_MAXIMO_KG)]
+
+    peso = np.round(azar.uniform(0.1, min(100, motor.PESO_MAXIMO_KG), filas), 2)
+    en_limite = azar.random(filas) < 0.1
+    if len(tramos) > 0:
+        peso[en_limite] = azar.choice(tramos, en_limite.sum())
+
+    return pd.DataFrame({
+        "ORIGEN": azar.choice(variantes, filas),
+        "DESTINO": azar.choice(variantes, filas),
+        "TARIFARIO": azar.choice(maestros["ma_tarifa_peso"]["TARIFARIO"].dropna().unique(), filas),
+        "PESO": peso,
+        "TIPO ENTREGA": azar.choice(maestros["ma_tipo_entrega"]["TIPO ENTREGA"].dropna().unique(), filas),
+        "TIPO SERVICIO": azar.choice(maestros["ma_servicio"]["TIPO SERVICIO"].dropna().unique(), filas)
+    })
+
+def escribir_maestros_sinteticos(directorio: str) -> None:
+    """
+    Escribe un juego pequeño y consistente de maestros, para comparar motores sin los maestros reales.
+
+    Args:
+        directorio (str): Carpeta de destino (se crea si no existe).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    regiones = [1, 2, 3]
+    ciudades = pd.DataFrame({
+        "ID_CIUDAD": range(1, 9),
+        "ID_REGION": [1, 1, 1, 2, 2, 3, 3, 3],
+        "COMUNA": ["SANTIAGO", "PROVIDENCIA", "MAIPU", "VALPARAISO", "VIÑA DEL MAR", "CONCEPCION", "TALCAHUANO", "CHILLAN"],
+        "CODIGO_POSTAL": ["8320000", "7500000", "9250000", "2340000", "2520000", "4030000", "4260000", "3780000"]
+    })
+    servicios = pd.DataFrame({"ID_SERVICIO": [1, 2], "TIPO SERVICIO": ["NORMAL", "EXPRESS"]})
+    entregas = pd.DataFrame({"ID_TIPO_ENTREGA": [1, 2], "TIPO ENTREGA": ["DOMICILIO", "AGENCIA"]})
+    combinaciones = [(s, e) for s in servicios["ID_SERVICIO"] for e in entregas["ID_TIPO_ENTREGA"]]
+
+    maestros = {
+        "ma_region": pd.DataFrame({"ID_REGION": regiones, "REGION": ["METROPOLITANA", "VALPARAISO", "BIOBIO"]}),
+        "ma_ciudad": ciudades,
+        "ma_troncal": pd.DataFrame([(o, d, 1000 * (1 + abs(o - d)), 10 + 150 * abs(o - d)) for o in regiones for d in regiones],
+                                   columns=["ID_REGION_ORIGEN", "ID_REGION_DESTINO", "COSTO_TRONCAL", "KM_RECORRIDO"]),
+        "ma_servicio": servicios,
+        "ma_tipo_entrega": entregas,
+        "ma_cargo_adicional": pd.DataFrame([(s, e, 300 * s + 100 * e) for s, e in combinaciones],
+                                           columns=["ID_SERVICIO", "ID_TIPO_ENTREGA", "CARGO_ADICIONAL"]),
+        "ma_tarifa_peso": pd.DataFrame([(t, p, v * f) for t, f in [("A", 1.0), ("B", 1.25)] for p, v in [(3, 2500), (10, 1800), (50, 1200), (1000, 900)]],
+                                       columns=["TARIFARIO", "PESO_KG", "VALOR_KG"]),
+        "ma_costo_handling": pd.DataFrame([(s, e, 200 * s + 50 * e) for s, e in combinaciones],
+                                          columns=["ID_SERVICIO", "ID_TIPO_ENTREGA", "COSTO_HANDLING"]),
+        "ma_costo_ultimamilla": pd.DataFrame({"ID_REGION": ciudades["ID_REGION"], "ID_CIUDAD": ciudades["ID_CIUDAD"],
+                                              "COSTO_ULTIMAMILLA": 800 + 50 * ciudades["ID_CIUDAD"]}),
+        # Agencias en todas las ciudades salvo la última, que se atiende como destino indirecto
+        "ma_agencia": pd.DataFrame({"AGENCODIGO": range(101, 108), "COMUCODIGO": range(1, 8), "CIUDCODIGO": range(1, 8),
+                                    "AGENESCENTRAL": [1, 0, 0, 1, 0, 1, 0], "AGENINIOPERACION": "08:00", "AGENFINOPERACION": "19:00",
+                                    "AGENINIATENCION": "09:00", "AGENFINATENCION": "18:00"}),
+        "ma_dest_indirecto": pd.DataFrame({"CIUDCODIGO": [8], "AGENCODIGOBASE": [106]}),
+        "rl_matriz_sector": pd.DataFrame([(i, 1, o, d, 1, 1) for i, (o, d) in enumerate(((o, d) for o in range(1, 9) for d in range(1, 9)), start=1)],
+                                         columns=["RMSECODIGO", "SECTCODIGO", "CIUDCODIGOORIGEN", "CIUDCODIGODESTINO", "TARFCODIGO", "RMSVERSION"])
+    }
+    for key, df in maestros.items():
+        df.to_excel(os.path.join(directorio, motor.ARCHIVOS_MAESTROS[key]), index=False)
+
+
+# --- Comparación ---
+
+def _es_numerica(serie: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+
+def comparar_resultados(referencia: tuple[pd.DataFrame, dict], candidato: tuple[pd.DataFrame, dict],
+                        rtol: float = 1e-9, atol: float = 1e-6) -> dict:
+    """
+    Compara la salida de un motor candidato con la de referencia.
+
+    Args:
+        referencia (tuple[pd.DataFrame, dict]): DataFrame final y resumen de referencia.
+        candidato (tuple[pd.DataFrame, dict]): DataFrame final y resumen del candidato.
+        rtol (float): Tolerancia relativa para valores numéricos.
+        atol (float): Tolerancia absoluta para valores numéricos.
+
+    Returns:
+        dict: Diferencias encontradas: 'filas' (referencia, candidato), 'columnas' (por columna:
+              cantidad de diferencias, máxima diferencia absoluta y filas de ejemplo), 'resumen'
+              (campos distintos con ambos valores) e 'iguales' (bool).
+    """
+    df_ref, resumen_ref = referencia
+    df_cand, resumen_cand = candidato
+    diferencias = {"filas": [len(df_ref), len(df_cand)], "columnas": {}, "resumen": {}}
+
+    for col in motor.COLUMNAS_RESULTADO_FINAL:
+        if col not in df_ref.columns or col not in df_cand.columns:
+            diferencias["columnas"][col] = {"error": "columna faltante en " + ("referencia" if col not in df_ref.columns else "candidato")}
+            continue
+        if len(df_ref) != len(df_cand):
+            continue # Sin filas alineadas no se compara valor a valor
+        ref = df_ref[col].reset_index(drop=True)
+        cand = df_cand[col].reset_index(drop=True)
+        max_abs = None
+        if _es_numerica(ref) and _es_numerica(cand):
+            a, b = ref.to_numpy(dtype=float), cand.to_numpy(dtype=float)
+            distintos = ~np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+            if distintos.any():
+                con_valor = distintos & ~np.isnan(a) & ~np.isnan(b)
+                max_abs = float(np.abs(a[con_valor] - b[con_valor]).max()) if con_valor.any() else None
+        else:
+            distintos = ~((ref.astype(object) == cand.astype(object)) | (ref.isnull() & cand.isnull())).to_numpy()
+        if distintos.any():
+            filas = np.flatnonzero(distintos)
+            diferencias["columnas"][col] = {
+                "diferencias": int(len(filas)),
+                "max_abs": max_abs,
+                "ejemplos": [{"fila": int(i), "referencia": _serializable(ref.iloc[i]), "candidato": _serializable(cand.iloc[i])}
+                             for i in filas[:MAX_EJEMPLOS]]
+            }
+
+    for campo in sorted(set(resumen_ref) | set(resumen_cand)):
+        if campo in CAMPOS_RESUMEN_IGNORADOS:
+            continue
+        a, b = resumen_ref.get(campo), resumen_cand.get(campo)
+        if isinstance(a, (int, float, np.number)) and isinstance(b, (int, float, np.number)):
+            iguales = bool(np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True))
+        else:
+            iguales = a == b
+        if not iguales:
+            diferencias["resumen"][campo] = {"referencia": _serializable(a), "candidato": _serializable(b)}
+
+    diferencias["iguales"] = (diferencias["filas"][0] == diferencias["filas"][1]
+                              and not diferencias["columnas"] and not diferencias["resumen"])
+    return diferencias
+
+def _serializable(valor):
+    """Convierte valores de NumPy/pandas a tipos que se pueden escribir en JSON."""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)) or valor is pd.NaT:
+        return None
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor if isinstance(valor, (str, int, float, bool)) else str(valor)
+
+def _ejecutar(funcion: Motor, config: motor.Configuracion, cotizar_df: pd.DataFrame) -> tuple[tuple, float, str]:
+    """Ejecuta un motor y devuelve su salida (o None), el tiempo y el error, si hubo."""
+    inicio = time.perf_counter()
+    try:
+        salida, error = funcion(config, cotizar_df.copy(), NOMBRE_EMPRESA), None
+    except Exception as e:
+        salida, error = None, f"{type(e).__name__}: {e}"
+    return salida, time.perf_counter() - inicio, error
+
+def comparar_motores(config: motor.Configuracion, candidatos: dict[str, Motor], entradas: dict[str, pd.DataFrame],
+                     rtol: float = 1e-9, atol: float = 1e-6, referencias: dict[str, tuple] = None) -> list[dict]:
+    """
+    Ejecuta la referencia y cada candidato sobre cada entrada y compara las salidas.
+
+    Si la referencia falla, el candidato debe fallar con el mismo tipo de error.
+
+    Args:
+        config (Configuracion): Configuración con los maestros.
+        candidatos (dict[str, Motor]): Motores a comparar, por nombre.
+        entradas (dict[str, pd.DataFrame]): Cotizaciones de entrada, por nombre.
+        rtol (float): Tolerancia relativa para valores numéricos.
+        atol (float): Tolerancia absoluta para valores numéricos.
+        referencias (dict[str, tuple], optional): Salidas de referencia guardadas, por entrada, como
+                                                  las entrega `cargar_referencia`. Por defecto se
+                                                  ejecuta `motor_referencia`.
+
+    Returns:
+        list[dict]: Un registro por entrada y candidato con tiempos, errores y diferencias.
+    """
+    registros = []
+    for nombre_entrada, cotizar_df in entradas.items():
+        if referencias is not None:
+            referencia, segundos_ref, error_ref = referencias[nombre_entrada]
+        else:
+            referencia, segundos_ref, error_ref = _ejecutar(motor_referencia, config, cotizar_df)
+        for nombre, funcion in candidatos.items():
+            salida, segundos, error = _ejecutar(funcion, config, cotizar_df)
+            registro = {"entrada": nombre_entrada, "filas": len(cotizar_df), "candidato": nombre,
+                        "segundos_referencia": segundos_ref, "segundos_candidato": segundos,
+                        "error_referencia": error_ref, "error_candidato": error}
+            if error_ref or error:
+                mismo_error = bool(error_ref and error) and error_ref.split(":")[0] == error.split(":")[0]
+                registro["diferencias"] = {"iguales": mismo_error}
+            else:
+                registro["diferencias"] = comparar_resultados(referencia, salida, rtol, atol)
+            registros.append(registro)
+    return registros
+
+
+# --- Referencia guardada ---
+
+def huella_maestros(config: motor.Configuracion) -> str:
+    """
+    Calcula un hash del contenido de todos los maestros.
+
+    Se usa el contenido y no la fecha de los archivos, porque los maestros sintéticos se vuelven
+    a escribir en cada ejecución.
+    """
+    huella = hashlib.sha256()
+    maestros = motor.cargar_maestros(config)
+    for key in motor.ARCHIVOS_MAESTROS:
+        if key in maestros:
+            df = maestros[key]
+        else:
+            almacen = motor.obtener_almacen_maestro(config, key)
+            df = almacen.cargar(almacen.columnas)
+        huella.update(f"{key}:{list(df.columns)}".encode("utf-8"))
+        huella.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return huella.hexdigest()
+
+def guardar_referencia(config: motor.Configuracion, entradas: dict[str, pd.DataFrame], directorio: str,
+                       parametros: dict = None) -> dict:
+    """
+    Ejecuta el flujo de referencia sobre cada entrada y guarda entradas y salidas (requiere pyarrow).
+
+    Por cada entrada se escriben `<entrada>.entrada.parquet`, `<entrada>.resultado.parquet` y
+    `<entrada>.resumen.json`; el manifiesto registra los parámetros de generación, las huellas de
+    los maestros y de la configuración, el tiempo y el error de la referencia, si hubo.
+
+    Args:
+        config (Configuracion): Configuración con los maestros.
+        entradas (dict[str, pd.DataFrame]): Cotizaciones de entrada, por nombre.
+        directorio (str): Carpeta de destino (se crea si no existe).
+        parametros (dict, optional): Parámetros con que se generaron las entradas (semilla, tamaños, plantilla).
+
+    Returns:
+        dict: Manifiesto escrito.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    manifiesto = {
+        "parametros": parametros or {},
+        "huella_maestros": huella_maestros(config),
+        "huella_configuracion": config.huella(),
+        "entradas": {}
+    }
+    for nombre, cotizar_df in entradas.items():
+        cotizar_df.to_parquet(os.path.join(directorio, f"{nombre}.entrada.parquet"), index=False)
+        salida, segundos, error = _ejecutar(motor_referencia, config, cotizar_df)
+        if salida is not None:
+            df_final, resumen_valores = salida
+            df_final.to_parquet(os.path.join(directorio, f"{nombre}.resultado.parquet"), index=False)
+            with open(os.path.join(directorio, f"{nombre}.resumen.json"), "w", encoding="utf-8") as f:
+                json.dump(resumen_valores, f, ensure_ascii=False, indent=2, default=_serializable)
+        manifiesto["entradas"][nombre] = {"filas": len(cotizar_df), "segundos": segundos, "error": error}
+
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO_REFERENCIA), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    return manifiesto
+
+def cargar_referencia(directorio: str) -> tuple[dict, dict[str, pd.DataFrame], dict[str, tuple]]:
+    """
+    Lee una referencia escrita con `guardar_referencia`.
+
+    Args:
+        directorio (str): Carpeta de la referencia.
+
+    Returns:
+        tuple[dict, dict[str, pd.DataFrame], dict[str, tuple]]: Manifiesto, entradas por nombre y
+            salida de referencia por nombre, como `(salida o None, segundos, error)`.
+    """
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO_REFERENCIA), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    entradas, referencias = {}, {}
+    for nombre, info in manifiesto["entradas"].items():
+        entradas[nombre] = pd.read_parquet(os.path.join(directorio, f"{nombre}.entrada.parquet"))
+        salida = None
+        if info["error"] is None:
+            with open(os.path.join(directorio, f"{nombre}.resumen.json"), encoding="utf-8") as f:
+                resumen_valores = json.load(f)
+            salida = (pd.read_parquet(os.path.join(directorio, f"{nombre}.resultado.parquet")), resumen_valores)
+        referencias[nombre] = (salida, info["segundos"], info["error"])
+    return manifiesto, entradas, referencias
+
+def imprimir_informe(registros: list[dict]) -> None:
+    """Muestra los tiempos lado a lado y el detalle de las diferencias."""
+    print(f"\n{'Entrada':<22}{'Filas':>8}  {'Candidato':<24}{'Ref. (s)':>9}{'Cand. (s)':>10}{'Acel.':>7}  Resultado")
+    for r in registros:
+        aceleracion = r["segundos_referencia"] / r["segundos_candidato"] if r["segundos_candidato"] else float("nan")
+        if r["error_referencia"] or r["error_candidato"]:
+            resultado = "mismo error" if r["diferencias"]["iguales"] else "ERROR DISTINTO"
+        elif r["diferencias"]["iguales"]:
+            resultado = "igual"
+        else:
+            d = r["diferencias"]
+            resultado = f"DIFERENTE: {len(d['columnas'])} columnas, {len(d['resumen'])} campos del resumen"
+            if d["filas"][0] != d["filas"][1]:
+                resultado += f", filas {d['filas'][0]} vs {d['filas'][1]}"
+        print(f"{r['entrada']:<22}{r['filas']:>8}  {r['candidato']:<24}{r['segundos_referencia']:>9.3f}"
+              f"{r['segundos_candidato']:>10.3f}{aceleracion:>6.1f}x  {resultado}")
+
+    for r in registros:
+        d = r["diferencias"]
+        if d["iguales"]:
+            continue
+        print(f"\n--- {r['entrada']} / {r['candidato']} ---")
+        if r["error_referencia"] or r["error_candidato"]:
+            print(f"  referencia: {r['error_referencia'] or 'ok'}\n  candidato:  {r['error_candidato'] or 'ok'}")
+            continue
+        for col, detalle in d["columnas"].items():
+            if "error" in detalle:
+                print(f"  {col}: {detalle['error']}")
+                continue
+            max_abs = f", máx. diferencia {detalle['max_abs']:.6g}" if detalle["max_abs"] is not None else ""
+            ejemplos = "; ".join(f"fila {e['fila']}: {e['referencia']!r} vs {e['candidato']!r}" for e in detalle["ejemplos"])
+            print(f"  {col}: {detalle['diferencias']} filas{max_abs} ({ejemplos})")
+        for campo, valores in d["resumen"].items():
+            print(f"  resumen.{campo}: {valores['referencia']!r} vs {valores['candidato']!r}")
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Comparación diferencial de motores de cálculo.")
+    parser.add_argument("--candidato", action="append", default=[], help="Motor candidato 'modulo:funcion' (se puede repetir).")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[100, 1000, 10000], help="Envíos de cada cotización generada.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de las cotizaciones generadas.")
+    parser.add_argument("--datos", default="data/", help="Carpeta de archivos maestros (por defecto: data/).")
+    parser.add_argument("--config", default="config.toml", help="Archivo de configuración TOML (por defecto: config.toml).")
+    parser.add_argument("--plantilla", default=os.path.join("data", "Cotizar.xlsx"), help="Cotización incluida en la comparación.")
+    parser.add_argument("--maestros-sinteticos", metavar="CARPETA", help="Escribir maestros sintéticos en CARPETA y usarlos.")
+    parser.add_argument("--rtol", type=float, default=1e-9, help="Tolerancia relativa (por defecto: 1e-9).")
+    parser.add_argument("--atol", type=float, default=1e-6, help="Tolerancia absoluta (por defecto: 1e-6).")
+    parser.add_argument("--reporte", help="Guardar el detalle de la comparación en un archivo JSON.")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--guardar-referencia", metavar="CARPETA", help="Guardar las entradas y salidas de referencia en CARPETA y terminar.")
+    modo.add_argument("--referencia", metavar="CARPETA", help="Comparar contra la referencia guardada en CARPETA, con sus mismas entradas.")
+    args = parser.parse_args(argv)
+
+    if args.maestros_sinteticos:
+        escribir_maestros_sinteticos(args.maestros_sinteticos)
+        args.datos = args.maestros_sinteticos
+    config = motor.Configuracion(base_path=args.datos, archivo_config=args.config if os.path.exists(args.config) else None)
+    ok, faltantes = motor.validar_archivos(config)
+    if not ok:
+        print(f"Error: faltan archivos maestros: {', '.join(faltantes)}", file=sys.stderr)
+        return 1
+
+    candidatos = {ruta: cargar_motor(ruta) for ruta in args.candidato} or CANDIDATOS_POR_DEFECTO
+    referencias = None
+    if args.referencia:
+        manifiesto, entradas, referencias = cargar_referencia(args.referencia)
+        if manifiesto["huella_maestros"] != huella_maestros(config) or manifiesto["huella_configuracion"] != config.huella():
+            print("Advertencia: los maestros o la configuración cambiaron desde que se guardó la referencia.", file=sys.stderr)
+    else:
+        maestros = motor.cargar_maestros(config)
+        entradas = {}
+        if os.path.exists(args.plantilla):
+            entradas[os.path.basename(args.plantilla)] = pd.read_excel(args.plantilla)
+        for tamano in args.tamanos:
+            entradas[f"generada_{tamano}"] = generar_cotizacion(maestros, tamano, args.semilla)
+
+    if args.guardar_referencia:
+        parametros = {"semilla": args.semilla, "tamanos": args.tamanos,
+                      "plantilla": args.plantilla if os.path.exists(args.plantilla) else None}
+        manifiesto = guardar_referencia(config, entradas, args.guardar_referencia, parametros)
+        for nombre, info in manifiesto["entradas"].items():
+            print(f"{nombre:<22}{info['filas']:>8}  {info['segundos']:>7.3f} s  {info['error'] or 'ok'}")
+        print(f"\nReferencia guardada en {args.guardar_referencia}")
+        return 0
+
+    registros = comparar_motores(config, candidatos, entradas, args.rtol, args.atol, referencias)
+    imprimir_informe(registros)
+    if args.reporte:
+        with open(args.reporte, "w", encoding="utf-8") as f:
+            json.dump(registros, f, ensure_ascii=False, indent=2, default=_serializable)
+        print(f"\nReporte: {args.reporte}")
+    return 0 if all(r["diferencias"]["iguales"] for r in registros) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Evaluación comercial por lotes, sin interfaz.
+
+Procesa todos los archivos de cotización de una carpeta (o de un manifiesto CSV con las
+columnas ARCHIVO y EMPRESA), escribe un informe por cliente y un resumen consolidado.
+El avance se guarda después de cada archivo, por lo que una ejecución interrumpida
+continúa donde quedó.
+
+Uso:
+    python evaluacion_lote.py <carpeta|manifiesto.csv> --salida informes/ [--procesos 4]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+import Evaluacion_Comercial as motor
+from ingesta_cotizacion import leer_cotizacion
+
+ARCHIVO_PROGRESO = "progreso.jsonl"
+
+
+def leer_entradas(entrada: str) -> list[tuple[str, str]]:
+    """
+    Obtiene la lista de archivos a evaluar y el nombre de empresa de cada uno.
+
+    Args:
+        entrada (str): Carpeta con archivos .xlsx o manifiesto .csv con columnas ARCHIVO y EMPRESA.
+                       En una carpeta, el nombre de la empresa es el nombre del archivo.
+
+    Returns:
+        list[tuple[str, str]]: Lista de (ruta del archivo, nombre de empresa). Las filas del
+                               manifiesto sin ARCHIVO se omiten con un aviso.
+    """
+    if os.path.isdir(entrada):
+        archivos = sorted(f for f in os.listdir(entrada) if f.lower().endswith(".xlsx") and not f.startswith("~$"))
+        return [(os.path.join(entrada, f), os.path.splitext(f)[0]) for f in archivos]
+
+    manifiesto = pd.read_csv(entrada, dtype=str) # Nombres como '001' no se convierten en números
+    manifiesto.columns = manifiesto.columns.str.upper().str.strip()
+    if "ARCHIVO" not in manifiesto.columns:
+        raise ValueError(f"El manifiesto '{entrada}' debe tener la columna 'ARCHIVO'.")
+    base = os.path.dirname(os.path.abspath(entrada))
+    entradas = []
+    for i, fila in manifiesto.iterrows():
+        archivo = fila["ARCHIVO"].strip() if isinstance(fila["ARCHIVO"], str) else ""
+        if not archivo:
+            print(f"Aviso: la fila {i + 2} del manifiesto no tiene ARCHIVO y se omite.", file=sys.stderr)
+            continue
+        ruta = archivo if os.path.isabs(archivo) else os.path.join(base, archivo)
+        empresa = fila.get("EMPRESA")
+        entradas.append((ruta, empresa if isinstance(empresa, str) and empresa else os.path.splitext(os.path.basename(ruta))[0]))
+    return entradas
+
+
+def clave_entrada(ruta: str, empresa: str) -> str:
+    """Identifica una entrada por ruta, empresa y versión del archivo, para reanudar sin repetir trabajo."""
+    try:
+        stat = os.stat(ruta)
+    except OSError:
+        # Archivo inexistente o inaccesible: la entrada queda registrada como error al
+        # evaluarla, sin detener el resto del lote
+        return f"{os.path.abspath(ruta)}|{empresa}|no_disponible"
+    return f"{os.path.abspath(ruta)}|{empresa}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def reservar_informe(salida: str, ruta: str, empresa: str) -> str:
+    """
+    Elige la ruta del informe de una entrada sin sobrescribir informes existentes.
+
+    El nombre incluye el archivo de entrada cuando no coincide con la empresa, y si aun así ya
+    existe (varias entradas de la misma empresa en el mismo segundo) se agrega un sufijo. El
+    archivo se crea vacío de forma exclusiva, para que dos procesos no elijan el mismo nombre.
+
+    Args:
+        salida (str): Carpeta de salida.
+        ruta (str): Ruta del archivo de cotización.
+        empresa (str): Nombre de la empresa.
+
+    Returns:
+        str: Ruta reservada para el informe.
+    """
+    origen = os.path.splitext(os.path.basename(ruta))[0]
+    base, extension = os.path.splitext(motor.generar_nombre_archivo(empresa if origen == empresa else f"{empresa} {origen}"))
+    sufijo = ""
+    for intento in range(1, 1000):
+        informe = os.path.join(salida, f"{base}{sufijo}{extension}")
+        try:
+            os.close(os.open(informe, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return informe
+        except FileExistsError:
+            sufijo = f"_{intento + 1}"
+    raise FileExistsError(f"No se encontró un nombre libre para el informe de '{empresa}' en '{salida}'.")
+
+
+def leer_progreso(salida: str) -> dict[str, dict]:
+    """
+    Lee los archivos ya procesados en ejecuciones anteriores.
+
+    Args:
+        salida (str): Carpeta de salida.
+
+    Returns:
+        dict[str, dict]: Registro de cada entrada procesada, por su clave.
+    """
+    ruta = os.path.join(salida, ARCHIVO_PROGRESO)
+    progreso = {}
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            for linea in f:
+                if linea.strip():
+                    try:
+                        registro = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue # Línea incompleta de una ejecución interrumpida
+                    progreso[registro["clave"]] = registro
+    return progreso
+
+
+def registrar_progreso(salida: str, registro: dict) -> None:
+    """Agrega el resultado de un archivo al registro de progreso."""
+    with open(os.path.join(salida, ARCHIVO_PROGRESO), "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False, default=float) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def evaluar_archivo(config: motor.Configuracion, ruta: str, empresa: str, salida: str, cubos_parquet: bool = False) -> dict:
+    """
+    Evalúa un archivo de cotización y escribe su informe.
+
+    Args:
+        config (Configuracion): Instancia de configuración.
+        ruta (str): Ruta del archivo de cotización.
+        empresa (str): Nombre de la empresa.
+        salida (str): Carpeta de salida.
+        cubos_parquet (bool): Guardar también los cubos de rentabilidad como Parquet.
+
+    Returns:
+        dict: Registro con estado, informe generado, advertencias y valores de resumen (o el error).
+    """
+    registro = {"clave": clave_entrada(ruta, empresa), "archivo": ruta, "empresa": empresa}
+    informe = None
+    try:
+        cotizar_df = leer_cotizacion(ruta)
+        if cotizar_df.empty:
+            raise ValueError("El archivo está vacío o no contiene datos válidos.")
+        # Dentro de un lote se paraleliza por archivo, no dentro de cada cálculo
+        df_final, resumen_valores, advertencias = motor.evaluar_cotizacion(config, cotizar_df, empresa, n_procesos=1)
+        informe = reservar_informe(salida, ruta, empresa)
+        cubos = motor.calcular_cubos(motor.cubo_base_parcial(df_final))
+        motor.escribir_informe_excel(df_final, resumen_valores, informe, cubos)
+        if cubos_parquet:
+            motor.guardar_cubos_parquet(cubos, os.path.splitext(informe)[0] + "_cubos")
+        registro.update(estado="ok", informe=informe, advertencias=advertencias, resumen=resumen_valores)
+    except Exception as e:
+        if informe is not None and os.path.exists(informe):
+            os.remove(informe) # No dejar el informe reservado vacío o a medio escribir
+        registro.update(estado="error", error=f"{type(e).__name__}: {e}")
+    return registro
+
+
+# Configuración disponible en cada proceso de trabajo
+_CONFIG_PROCESO: motor.Configuracion = None
+
+def _inicializar_proceso(config: motor.Configuracion) -> None:
+    global _CONFIG_PROCESO
+    _CONFIG_PROCESO = config
+
+def _evaluar_en_proceso(ruta: str, empresa: str, salida: str, cubos_parquet: bool) -> dict:
+    return evaluar_archivo(_CONFIG_PROCESO, ruta, empresa, salida, cubos_parquet)
+
+
+def escribir_resumen_consolidado(progreso: dict[str, dict], salida: str) -> str:
+    """
+    Escribe una tabla con el resumen de cada cliente evaluado.
+
+    Args:
+        progreso (dict[str, dict]): Registros de progreso de todas las entradas.
+        salida (str): Carpeta de salida.
+
+    Returns:
+        str: Ruta del archivo consolidado.
+    """
+    filas = []
+    for registro in progreso.values():
+        fila = {"archivo": registro["archivo"], "empresa": registro["empresa"], "estado": registro["estado"],
+                "informe": registro.get("informe"), "error": registro.get("error")}
+        fila.update({k: v for k, v in registro.get("resumen", {}).items() if k != "nombre_empresa"})
+        filas.append(fila)
+
+    consolidado = pd.DataFrame(filas)
+    ruta = os.path.join(salida, f"Resumen_Consolidado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    consolidado.to_excel(ruta, sheet_name="Resumen Clientes", index=False)
+    return ruta
+
+
+def ejecutar_lote(entrada: str, salida: str, config: motor.Configuracion, n_procesos: int = 1, reiniciar: bool = False,
+                  cubos_parquet: bool = False) -> str:
+    """
+    Evalúa todas las cotizaciones de la entrada, reanudando desde el progreso guardado.
+
+    Args:
+        entrada (str): Carpeta o manifiesto CSV.
+        salida (str): Carpeta de salida para informes, progreso y resumen consolidado.
+        config (Configuracion): Instancia de configuración.
+        n_procesos (int): Archivos a evaluar en paralelo.
+        reiniciar (bool): Ignorar el progreso guardado y evaluar todo de nuevo.
+        cubos_parquet (bool): Guardar también los cubos de rentabilidad de cada cliente como Parquet.
+
+    Returns:
+        str: Ruta del resumen consolidado.
+    """
+    os.makedirs(salida, exist_ok=True)
+    if reiniciar and os.path.exists(os.path.join(salida, ARCHIVO_PROGRESO)):
+        os.remove(os.path.join(salida, ARCHIVO_PROGRESO))
+
+    ok, faltantes = motor.validar_archivos(config)
+    if not ok:
+        raise ValueError(f"Faltan archivos maestros: {', '.join(faltantes)}")
+
+    # Cargar los maestros una sola vez; los procesos de trabajo heredan la caché
+    motor.cargar_maestros(config)
+    motor.obtener_indice_agencias(config)
+
+    entradas = leer_entradas(entrada)
+    progreso = leer_progreso(salida)
+    vigentes = {clave_entrada(ruta, empresa): (ruta, empresa) for ruta, empresa in entradas}
+    pendientes = [(ruta, empresa) for clave, (ruta, empresa) in vigentes.items()
+                  if progreso.get(clave, {}).get("estado") != "ok"]
+    print(f"{len(entradas)} archivos, {len(entradas) - len(pendientes)} ya procesados, {len(pendientes)} pendientes.")
+
+    def _registrar(registro: dict) -> None:
+        registrar_progreso(salida, registro)
+        progreso[registro["clave"]] = registro
+        detalle = registro.get("informe") if registro["estado"] == "ok" else registro.get("error")
+        print(f"[{registro['estado']}] {registro['empresa']}: {detalle}")
+
+    if n_procesos > 1 and len(pendientes) > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=n_procesos, initializer=_inicializar_proceso, initargs=(config,)) as executor:
+            futuros = [executor.submit(_evaluar_en_proceso, ruta, empresa, salida, cubos_parquet) for ruta, empresa in pendientes]
+            for futuro in as_completed(futuros):
+                _registrar(futuro.result())
+    else:
+        for ruta, empresa in pendientes:
+            _registrar(evaluar_archivo(config, ruta, empresa, salida, cubos_parquet))
+
+    # El consolidado solo incluye las entradas del lote actual
+    return escribir_resumen_consolidado({clave: progreso[clave] for clave in vigentes if clave in progreso}, salida)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluación comercial por lotes.")
+    parser.add_argument("entrada", help="Carpeta con archivos .xlsx o manifiesto .csv (columnas ARCHIVO, EMPRESA).")
+    parser.add_argument("--salida", default="informes", help="Carpeta de salida (por defecto: informes).")
+    parser.add_argument("--datos", default="data/", help="Carpeta de archivos maestros (por defecto: data/).")
+    parser.add_argument("--config", default="config.toml", help="Archivo de configuración TOML (por defecto: config.toml).")
+    parser.add_argument("--procesos", type=int, default=1, help="Archivos a evaluar en paralelo (por defecto: 1).")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar el progreso guardado y evaluar todo de nuevo.")
+    parser.add_argument("--cubos-parquet", action="store_true", help="Guardar los cubos de rentabilidad como Parquet (requiere pyarrow).")
+    args = parser.parse_args(argv)
+
+    config = motor.Configuracion(base_path=args.datos, archivo_config=args.config if os.path.exists(args.config) else None)
+    try:
+        consolidado = ejecutar_lote(args.entrada, args.salida, config, n_procesos=args.procesos, reiniciar=args.reiniciar,
+                                    cubos_parquet=args.cubos_parquet)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Resumen consolidado: {consolidado}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
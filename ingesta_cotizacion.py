@@ -0,0 +1,341 @@
+"""
+Lectura rápida de archivos de cotización .xlsx.
+
+El XML de la hoja se lee una sola vez desde el zip y se divide en bloques de filas completas.
+Cada bloque se interpreta por separado (en serie o en procesos de trabajo), informando el
+avance a medida que los bloques terminan. En vez de recorrer el árbol XML celda por celda,
+las celdas de un bloque se extraen con una sola expresión regular y se convierten por
+columnas con NumPy; la inferencia final de tipos la hace el mismo analizador que usa
+`pd.read_excel`, de modo que el DataFrame resultante es equivalente:
+
+- cadenas compartidas, cadenas en línea y fórmulas con resultado de texto;
+- números enteros como int y el resto como float; fechas según el formato de la celda;
+- celdas con error como vacías y filas intermedias vacías como filas de NaN.
+
+Los bloques entregan los valores de las celdas sin inferir tipos; la inferencia se hace una
+sola vez sobre todas las filas, como en `read_excel`, para que una columna de códigos que en
+algunos bloques parecen números (por ejemplo '001') y en otros no ('A1') quede igual. Si el
+archivo no tiene la estructura esperada se usa `pd.read_excel` directamente.
+"""
+import html
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+from pandas.io.parsers import TextParser
+
+NS_URI = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS = f"{{{NS_URI}}}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PAQUETE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Tamaño aproximado de cada bloque del XML de la hoja (caracteres descomprimidos)
+TAMANO_BLOQUE_XML = 8 * 1024 * 1024
+
+# Función de avance: recibe la fracción completada (0 a 1) y un mensaje
+FuncionProgreso = Callable[[float, str], None]
+
+# Celda <c r="B12" ...>: columna, fila, atributos, valor <v> (después de una fórmula <f>, si hay) y resto
+_PATRON_CELDA = re.compile(
+    r'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(?:<f[^>]*?(?:/>|>.*?</f>))?(?:<v>([^<]*)</v>)?(.*?)</c>)', re.S
+)
+_PATRON_TIPO = re.compile(r'\bt="(\w+)"')
+_PATRON_ESTILO = re.compile(r'\bs="(\d+)"')
+_PATRON_ENTERO = re.compile(r"-?\d+")
+
+
+class _FormatoNoSoportado(Exception):
+    """El XML de la hoja no tiene la estructura que interpreta este lector."""
+
+
+# --- Metadatos del libro ---
+
+def _ruta_primera_hoja(libro: zipfile.ZipFile) -> str:
+    """Devuelve la ruta dentro del zip de la primera hoja del libro (la que lee `read_excel`)."""
+    workbook = ET.fromstring(libro.read("xl/workbook.xml"))
+    id_relacion = workbook.find(f"{NS}sheets/{NS}sheet").get(f"{NS_REL}id")
+    relaciones = ET.fromstring(libro.read("xl/_rels/workbook.xml.rels"))
+    for relacion in relaciones.iter(f"{NS_PAQUETE}Relationship"):
+        if relacion.get("Id") == id_relacion:
+            destino = relacion.get("Target")
+            return destino.lstrip("/") if destino.startswith("/") else f"xl/{destino}"
+    raise _FormatoNoSoportado("No se encontró la primera hoja del libro.")
+
+def _epoca(libro: zipfile.ZipFile):
+    """Calendario de fechas del libro (1900 o 1904)."""
+    propiedades = ET.fromstring(libro.read("xl/workbook.xml")).find(f"{NS}workbookPr")
+    fecha_1904 = propiedades is not None and propiedades.get("date1904") in ("1", "true")
+    return CALENDAR_MAC_1904 if fecha_1904 else CALENDAR_WINDOWS_1900
+
+def _texto_enriquecido(elemento) -> str:
+    """Texto de un elemento <si> o <is>: texto simple o concatenación de fragmentos <r>, sin fonética."""
+    texto = elemento.find(f"{NS}t")
+    if texto is not None:
+        return texto.text or ""
+    return "".join(r.findtext(f"{NS}t", "") for r in elemento.iter(f"{NS}r"))
+
+def _texto_en_linea(contenido: str) -> str:
+    """Texto de una celda t="inlineStr" a partir de su contenido; sin elemento <is> es una celda vacía."""
+    elemento = ET.fromstring(f'<c xmlns="{NS_URI}">{contenido}</c>').find(f"{NS}is")
+    return "" if elemento is None else _texto_enriquecido(elemento)
+
+def _cadenas_compartidas(libro: zipfile.ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in libro.namelist():
+        return []
+    return [_texto_enriquecido(si) for si in ET.fromstring(libro.read("xl/sharedStrings.xml")).iter(f"{NS}si")]
+
+def _estilos_fecha(libro: zipfile.ZipFile) -> set[int]:
+    """Índices de estilo de celda cuyo formato numérico es de fecha u hora."""
+    if "xl/styles.xml" not in libro.namelist():
+        return set()
+    estilos = ET.fromstring(libro.read("xl/styles.xml"))
+    formatos = dict(BUILTIN_FORMATS)
+    for formato in estilos.iter(f"{NS}numFmt"):
+        formatos[int(formato.get("numFmtId"))] = formato.get("formatCode")
+    celdas = estilos.find(f"{NS}cellXfs")
+    if celdas is None:
+        return set()
+    return {i for i, xf in enumerate(celdas.iter(f"{NS}xf"))
+            if is_date_format(formatos.get(int(xf.get("numFmtId", 0)), "General"))}
+
+
+# --- Conversión de bloques de filas ---
+
+class _MetadatosLibro(NamedTuple):
+    """Datos del libro necesarios para interpretar las celdas de la hoja."""
+    cadenas: np.ndarray
+    estilos_fecha: list[int]
+    epoca: datetime
+
+def _metadatos_libro(libro: zipfile.ZipFile) -> _MetadatosLibro:
+    return _MetadatosLibro(np.array(_cadenas_compartidas(libro), dtype=object),
+                           sorted(_estilos_fecha(libro)), _epoca(libro))
+
+# Resultado de un fragmento sin filas con datos
+_SIN_FILAS = (np.array([], dtype=np.int64), np.empty((0, 0), dtype=object))
+
+# Metadatos del libro en curso, solo dentro de los procesos de trabajo (cada lectura en
+# paralelo crea su propio grupo de procesos). El proceso principal nunca los usa: pueden
+# haber varias lecturas simultáneas en hilos distintos, cada una con su propio libro.
+_METADATOS_PROCESO: _MetadatosLibro = None
+
+def _inicializar_proceso(metadatos: _MetadatosLibro) -> None:
+    global _METADATOS_PROCESO
+    _METADATOS_PROCESO = metadatos
+
+def _indice_columna(letras: str) -> int:
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+def _numeros(valores: np.ndarray) -> np.ndarray:
+    """Convierte textos numéricos como openpyxl y `read_excel`: int si es entero, si no float."""
+    resultado = np.empty(len(valores), dtype=object)
+    enteros = np.array([_PATRON_ENTERO.fullmatch(v) is not None for v in valores], dtype=bool)
+    resultado[enteros] = [int(v) for v in valores[enteros]]
+    decimales = valores[~enteros].astype(np.float64)
+    integrales = np.isfinite(decimales) & (decimales == np.floor(decimales))
+    convertidos = decimales.astype(object)
+    convertidos[integrales] = [int(v) for v in decimales[integrales]]
+    resultado[~enteros] = convertidos
+    return resultado
+
+def _filas_fragmento(fragmento: str, metadatos: _MetadatosLibro) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Interpreta un fragmento de filas <row> completas.
+
+    Cualquier error al interpretar las celdas se informa como `_FormatoNoSoportado`, para que
+    el archivo se lea con el lector estándar en vez de fallar.
+
+    Args:
+        fragmento (str): XML con filas completas.
+        metadatos (_MetadatosLibro): Cadenas compartidas, estilos de fecha y calendario del libro.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Número de fila en Excel de cada fila con datos y grilla de
+                                       sus valores ("" = vacío), con el ancho de la fila más larga
+                                       del fragmento.
+    """
+    try:
+        return _interpretar_celdas(fragmento, metadatos)
+    except _FormatoNoSoportado:
+        raise
+    except Exception as e:
+        raise _FormatoNoSoportado(f"Celda no interpretable: {type(e).__name__}: {e}") from e
+
+def _interpretar_celdas(fragmento: str, metadatos: _MetadatosLibro) -> tuple[np.ndarray, np.ndarray]:
+    celdas = _PATRON_CELDA.findall(fragmento)
+    # Toda celda debe calzar con el patrón; si no (por ejemplo, sin atributo r), se usa el lector estándar
+    if len(celdas) != fragmento.count("<c ") + fragmento.count("<c>"):
+        raise _FormatoNoSoportado("Celdas con una estructura no soportada.")
+    if not celdas:
+        return _SIN_FILAS
+    letras, filas, atributos, valores, resto = pd.DataFrame(celdas).to_numpy().T
+
+    # Los atributos se repiten mucho (t="s", s="1" t="s", ...): se interpretan una vez por valor distinto
+    codigos, distintos = pd.factorize(atributos)
+    tipos = np.array([m.group(1) if (m := _PATRON_TIPO.search(a)) else "n" for a in distintos], dtype=object)[codigos]
+    estilos = np.array([int(m.group(1)) if (m := _PATRON_ESTILO.search(a)) else 0 for a in distintos])[codigos]
+    codigos, distintos = pd.factorize(letras)
+    columnas = np.array([_indice_columna(l) for l in distintos], dtype=np.int64)[codigos]
+
+    convertidos = np.empty(len(celdas), dtype=object)
+    con_valor = valores != ""
+
+    compartidas = (tipos == "s") & con_valor
+    convertidos[compartidas] = metadatos.cadenas[valores[compartidas].astype(np.int64)]
+
+    textos = (tipos == "str") & con_valor
+    convertidos[textos] = [html.unescape(v) for v in valores[textos]]
+
+    en_linea = tipos == "inlineStr"
+    convertidos[en_linea] = [_texto_en_linea(r) for r in resto[en_linea]]
+    en_linea &= convertidos != "" # Una cadena en línea vacía es una celda vacía
+
+    booleanos = (tipos == "b") & con_valor
+    convertidos[booleanos] = valores[booleanos] == "1"
+
+    fechas_iso = (tipos == "d") & con_valor
+    convertidos[fechas_iso] = [datetime.fromisoformat(v) for v in valores[fechas_iso]]
+
+    numericas = (tipos == "n") & con_valor
+    fechas = numericas & np.isin(estilos, metadatos.estilos_fecha)
+    convertidos[fechas] = [from_excel(float(v), metadatos.epoca) for v in valores[fechas]]
+    numericas &= ~fechas
+    convertidos[numericas] = _numeros(valores[numericas])
+
+    # Las celdas vacías, con fórmula sin valor calculado o con error (t="e") no aportan datos
+    usadas = compartidas | textos | en_linea | booleanos | fechas_iso | fechas | numericas
+    filas = filas[usadas].astype(np.int64)
+    columnas, convertidos = columnas[usadas], convertidos[usadas]
+    if len(filas) == 0:
+        return _SIN_FILAS
+    numeros, posicion = np.unique(filas, return_inverse=True)
+    grilla = np.full((len(numeros), columnas.max() + 1), "", dtype=object)
+    grilla[posicion, columnas] = convertidos
+    return numeros, grilla
+
+def _nombres_columnas(columnas: list[str], ancho: int) -> list[str]:
+    """Encabezado extendido a `ancho` columnas, con los nombres que asigna `read_excel` a las columnas sin encabezado."""
+    return columnas + [f"Unnamed: {i}" for i in range(len(columnas), ancho)]
+
+def _filas_fragmento_en_proceso(fragmento: str) -> tuple[np.ndarray, np.ndarray]:
+    """`_filas_fragmento` en un proceso de trabajo, con los metadatos recibidos al iniciarlo."""
+    return _filas_fragmento(fragmento, _METADATOS_PROCESO)
+
+def _unir_bloques(partes: list[tuple[np.ndarray, np.ndarray]], ancho: int) -> tuple[np.ndarray, np.ndarray]:
+    """Une las filas de todos los bloques en una sola grilla de `ancho` columnas."""
+    numeros = np.concatenate([numeros for numeros, _ in partes])
+    grilla = np.full((len(numeros), ancho), "", dtype=object)
+    inicio = 0
+    for _, parte in partes:
+        grilla[inicio:inicio + len(parte), :parte.shape[1]] = parte
+        inicio += len(parte)
+    return numeros, grilla
+
+
+# --- Lectura completa ---
+
+def _cortes_bloques(xml: str, inicio: int, fin: int, tamano_bloque: int) -> list[tuple[int, int]]:
+    """Divide el rango de filas del XML en bloques que empiezan siempre en una etiqueta <row."""
+    cortes = [inicio]
+    while cortes[-1] + tamano_bloque < fin:
+        siguiente = xml.find("<row", cortes[-1] + tamano_bloque, fin)
+        if siguiente == -1:
+            break
+        cortes.append(siguiente)
+    cortes.append(fin)
+    return list(zip(cortes[:-1], cortes[1:]))
+
+def leer_cotizacion(origen, n_procesos: int = 1, progreso: FuncionProgreso = None,
+                    tamano_bloque: int = TAMANO_BLOQUE_XML) -> pd.DataFrame:
+    """
+    Lee la primera hoja de un archivo .xlsx de forma equivalente a `pd.read_excel(origen)`.
+
+    Args:
+        origen: Ruta del archivo u objeto tipo archivo (por ejemplo, el archivo subido en Streamlit).
+        n_procesos (int): Procesos para interpretar los bloques en paralelo (1 = en este proceso).
+        progreso (FuncionProgreso, optional): Se llama después de cada bloque con la fracción completada.
+        tamano_bloque (int): Tamaño aproximado de cada bloque del XML, en caracteres.
+
+    Returns:
+        pd.DataFrame: Datos de la hoja, con la primera fila como encabezado.
+    """
+    def _avance(fraccion: float, mensaje: str) -> None:
+        if progreso is not None:
+            progreso(fraccion, mensaje)
+
+    try:
+        return _leer_por_bloques(origen, n_procesos, _avance, tamano_bloque)
+    except _FormatoNoSoportado:
+        if hasattr(origen, "seek"):
+            origen.seek(0)
+        _avance(0.0, "Leyendo el archivo con el lector estándar...")
+        df = pd.read_excel(origen)
+        _avance(1.0, f"{len(df):,} filas leídas.")
+        return df
+
+def _leer_por_bloques(origen, n_procesos: int, avance: FuncionProgreso, tamano_bloque: int) -> pd.DataFrame:
+    avance(0.0, "Descomprimiendo el archivo...")
+    with zipfile.ZipFile(origen) as libro:
+        xml = libro.read(_ruta_primera_hoja(libro)).decode("utf-8")
+        metadatos = _metadatos_libro(libro)
+
+    # Estructura esperada: filas <row> sin prefijo de espacio de nombres dentro de <sheetData>
+    inicio_datos = xml.find("<sheetData")
+    fin_datos = xml.find("</sheetData>")
+    if inicio_datos == -1 or fin_datos == -1:
+        raise _FormatoNoSoportado("La hoja no tiene la estructura esperada.")
+
+    # Encabezado: primera fila con datos, interpretada como lo hace `read_excel`
+    posicion = xml.find(">", inicio_datos) + 1
+    columnas, fila_encabezado = None, None
+    while columnas is None:
+        inicio_fila = xml.find("<row", posicion, fin_datos)
+        if inicio_fila == -1:
+            avance(1.0, "La hoja no tiene datos.")
+            return pd.DataFrame()
+        cierre = xml.find(">", inicio_fila)
+        posicion = cierre + 1 if xml[cierre - 1] == "/" else xml.find("</row>", inicio_fila) + len("</row>")
+        numeros, filas = _filas_fragmento(xml[inicio_fila:posicion], metadatos)
+        if len(filas) > 0:
+            fila_encabezado = int(numeros[0])
+            columnas = list(TextParser([filas[0].tolist()], header=0).read().columns)
+
+    bloques = _cortes_bloques(xml, posicion, fin_datos, tamano_bloque)
+    partes = []
+    if n_procesos > 1 and len(bloques) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_procesos, initializer=_inicializar_proceso,
+                                 initargs=(metadatos,)) as executor:
+            futuros = [executor.submit(_filas_fragmento_en_proceso, xml[a:b]) for a, b in bloques]
+            for i, futuro in enumerate(futuros, start=1):
+                partes.append(futuro.result())
+                avance(i / len(bloques), f"Bloque {i} de {len(bloques)} leído.")
+    else:
+        for i, (a, b) in enumerate(bloques, start=1):
+            partes.append(_filas_fragmento(xml[a:b], metadatos))
+            avance(i / len(bloques), f"Bloque {i} de {len(bloques)} leído.")
+
+    partes = [(numeros, filas) for numeros, filas in partes if len(numeros) > 0]
+    if not partes:
+        avance(1.0, "La hoja no tiene filas de datos.")
+        return pd.DataFrame(columns=columnas)
+
+    # Inferencia de tipos una sola vez, sobre las filas de todos los bloques
+    ancho = max(len(columnas), *(filas.shape[1] for _, filas in partes))
+    numeros, filas = _unir_bloques(partes, ancho)
+    df = TextParser(filas.tolist(), header=None, names=_nombres_columnas(columnas, ancho)).read()
+    df.index = numeros
+    # Las filas vacías entre el encabezado y la última fila con datos se conservan como NaN
+    df = df.reindex(index=range(fila_encabezado + 1, int(numeros[-1]) + 1))
+    df = df.reset_index(drop=True)
+    avance(1.0, f"{len(df):,} filas leídas.")
+    return df